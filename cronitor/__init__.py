@@ -6,10 +6,10 @@ import sys
 import yaml
 from yaml.loader import SafeLoader
 import time
-import atexit
-import threading
 
 from .monitor import Monitor, YAML
+from .client import Client, default_client
+from . import schedule
 
 logger = logging.getLogger(__name__)
 logger.setLevel(logging.INFO)
@@ -25,9 +25,16 @@ if timeout is not None:
 
 celerybeat_only = False
 
-# monitor attributes can be synced at process startup
+# Deprecated: cronitor.job now queues attributes on default_client.sync. Attributes appended
+# here are still synced by sync_monitors().
 monitor_attributes = []
 
+# gzip the body of monitor PUT requests, useful for large configurations
+compress_requests = os.getenv('CRONITOR_COMPRESS_REQUESTS', 'false').lower() in ('1', 'true', 'yes')
+
+# hand pings off to a local relay (see `python -m cronitor relay`), e.g. unix:///var/run/cronitor.sock
+relay_address = os.getenv('CRONITOR_RELAY_ADDRESS', None)
+
 # this is a pointer to the module object instance itself.
 this = sys.modules[__name__]
 if this.config:
@@ -48,6 +55,9 @@ class AuthenticationError(Exception):
 class APIError(Exception):
     pass
 
+class RateLimitError(APIError):
+    pass
+
 class State(object):
     OK = 'ok'
     RUN = 'run'
@@ -55,22 +65,42 @@ class State(object):
     FAIL = 'fail'
 
 # include_output is deprecated in favor of log_output and can be removed in 5.0 release
-def job(key, env=None, log_output=True, include_output=True, attributes=None):
+def job(key, env=None, log_output=True, include_output=True, attributes=None, client=None, heartbeat=None):
 
+    watchdog = (client or default_client).watchdog
+    heartbeats = (client or default_client).heartbeats
     if type(attributes) is dict:
-        attributes['key'] = key
-        monitor_attributes.append(attributes)
+        # synced in the background, batched with other jobs registered around the same time
+        (client or default_client).sync.register(dict(attributes, key=key))
+
+        if attributes.get('schedule'):
+            try:
+                watchdog.track(key, attributes['schedule'],
+                               grace=attributes.get('grace_seconds') or schedule.DEFAULT_GRACE,
+                               max_duration=schedule.max_duration(attributes.get('assertions')),
+                               tz=attributes.get('timezone'))
+            except schedule.InvalidSchedule as e:
+                logger.warning("Invalid schedule for '%s': %s", key, e)
 
     def wrapper(func):
         @wraps(func)
         def wrapped(*args, **kwargs):
             start = datetime.now().timestamp()
 
-            monitor = Monitor(key, env=env)
+            monitor = (client.Monitor if client else Monitor)(key, env=env)
             # use start as the series param to match run/fail/complete correctly
             monitor.ping(state=State.RUN, series=start)
+            watchdog.run_started(key)
+            # optional progress pings every `heartbeat` seconds while the job is running
+            beat = heartbeats.start(monitor, heartbeat, series=start) if heartbeat else None
             try:
-                out = func(*args, **kwargs)
+                try:
+                    out = func(*args, **kwargs)
+                finally:
+                    # also reached on KeyboardInterrupt and SystemExit, so no heartbeat outlives the run
+                    if beat:
+                        beat.stop()
+                    watchdog.run_finished(key)
             except Exception as e:
                 duration = datetime.now().timestamp() - start
                 monitor.ping(state=State.FAIL, message=str(e), metrics={'duration': duration}, series=start)
@@ -90,8 +120,30 @@ def generate_config():
         conf.writelines(Monitor.as_yaml())
 
 def validate_config():
+    if this.config:
+        try:
+            validate_schedules(read_config(output=True))
+        except (yaml.YAMLError, ConfigValidationError) as e:
+            logger.error(e)
+            return False
     return apply_config(rollback=True)
 
+def validate_schedules(config):
+    """Check every job schedule in a config locally, raising ConfigValidationError listing any that are invalid."""
+    jobs = (config or {}).get('jobs') or {}
+    if isinstance(jobs, dict):
+        jobs = [dict(attributes or {}, key=key) for key, attributes in jobs.items()]
+
+    errors = []
+    for job in jobs:
+        if isinstance(job.get('schedule'), str):
+            try:
+                schedule.parse(job['schedule'])
+            except schedule.InvalidSchedule as e:
+                errors.append("'{}': {}".format(job.get('key'), e))
+    if errors:
+        raise ConfigValidationError('Invalid schedules: {}'.format('; '.join(errors)))
+
 def apply_config(rollback=False):
     if not this.config:
         raise ConfigValidationError("Must set a path to config file e.g. cronitor.config = './cronitor.yaml'")
@@ -120,17 +172,8 @@ def read_config(path=None, output=False):
             return data
 
 def sync_monitors(wait=1):
-    global monitor_attributes
     if wait > 0:
         time.sleep(wait)
-
-    if len(monitor_attributes):
-        Monitor.put(monitor_attributes)
-        monitor_attributes = []
-
-try:
-    sync
-except NameError:
-    sync = threading.Thread(target=sync_monitors)
-    sync.start()
-    atexit.register(sync.join)
+    while monitor_attributes:
+        default_client.sync.register(monitor_attributes.pop(0))
+    return default_client.sync.flush()
@@ -1,19 +1,45 @@
 import argparse
+import json
+import logging
 import os
+import signal
+import stat
+import subprocess
 import sys
+from datetime import datetime
 
+import requests
+
+import cronitor
+from .client import Client
 from .monitor import Monitor
+from .relay import DEFAULT_ADDRESS, RelayServer
 
 
-def main():
-    parser = argparse.ArgumentParser(prog="cronitor",
-                                     description='Send status messages to Cronitor ping API.')  # noqa
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    if argv and argv[0] in COMMANDS:
+        return COMMANDS[argv[0]](argv[1:])
+    return ping_command(argv)
+
+
+def _add_auth_args(parser):
     parser.add_argument('--apiKey', '-a', type=str,
                         default=os.getenv('CRONITOR_API_KEY'),
                         help='Auth Key from Account page')
-    parser.add_argument('--id', '-i', type=str,
+    parser.add_argument('--env', '-e', type=str,
+                        default=os.getenv('CRONITOR_ENVIRONMENT'),
+                        help='Environment to send events to')
+
+
+def ping_command(argv):
+    parser = argparse.ArgumentParser(prog="cronitor",
+                                     description='Send status messages to Cronitor ping API. '
+                                                 'Use `cronitor stream` or `cronitor exec` for multi-event modes.')  # noqa
+    _add_auth_args(parser)
+    parser.add_argument('--id', '-i', '--key', '-k', dest='id', type=str,
                         default=os.getenv('CRONITOR_ID', os.getenv('CRONITOR_CODE')),
-                        help='Monitor Id to take action upon')
+                        help='Monitor key to take action upon')
     # alias for id. deprecated.
     parser.add_argument('--code', '-c', type=str,
                         default=os.getenv('CRONITOR_CODE'),
@@ -31,34 +57,183 @@ def main():
                        help='Send a fail event')
     group.add_argument('--ok', '-o', action='store_true',
                        help='Send an ok event')
-    group.add_argument('--pause', '-p', type=str, default=24,
-                       help='Pause a monitor')
+    group.add_argument('--tick', '-t', action='store_true',
+                       help='Send a ping without a state')
+    group.add_argument('--pause', '-p', type=str,
+                       help='Pause a monitor for the given number of hours')
 
-    args = parser.parse_args()
+    args = parser.parse_args(argv)
 
-    if args.id is None and args.code is None:
-        print('A monitorId must be supplied using the --id flag or setting the CRONITOR_ID enviromenment variable.')
+    key = args.id or args.code
+    if key is None:
+        print('A monitor key must be supplied using the --key flag or setting the CRONITOR_ID enviromenment variable.')
         parser.print_help()
-        sys.exit(1)
+        return 1
 
-    monitor = Monitor(id=args.id, api_key=args.apiKey)
+    monitor = Monitor(key, api_key=args.apiKey, env=args.env)
 
     if args.run:
-        ret = monitor.ping('run', message=args.msg)
+        ret = monitor.ping(state=cronitor.State.RUN, message=args.msg)
     elif args.complete:
-        ret = monitor.ping('complete', message=args.msg)
-    elif args.tick:
-        ret = monitor.ping('tick', message=args.msg)
+        ret = monitor.ping(state=cronitor.State.COMPLETE, message=args.msg)
     elif args.fail:
-        ret = monitor.ping('fail', message=args.msg)
+        ret = monitor.ping(state=cronitor.State.FAIL, message=args.msg)
     elif args.ok:
-        ret = monitor.ping('ok', message=args.msg)
-    elif args.pause:
+        ret = monitor.ping(state=cronitor.State.OK, message=args.msg)
+    elif args.pause is not None:
         ret = monitor.pause(args.pause)
     else:
         ret = monitor.ping(message=args.msg)
-    return ret
+    return 0 if ret is not None and ret.ok else 1
+
+
+def parse_event(line):
+    """
+    Parse one line of the stream format. Lines are either JSON objects, e.g.
+    {"key": "nightly-backup", "state": "complete", "metrics": {"count": 10}},
+    or whitespace separated text: KEY [STATE [MESSAGE...]]. Blank lines and
+    lines starting with # are ignored and return None.
+    """
+    line = line.strip()
+    if not line or line.startswith('#'):
+        return None
+
+    if line.startswith('{'):
+        event = json.loads(line)
+        if not isinstance(event, dict) or not event.get('key'):
+            raise ValueError('Event must be an object with a key')
+    else:
+        parts = line.split(None, 2)
+        event = {'key': parts[0]}
+        if len(parts) > 1:
+            event['state'] = parts[1]
+        if len(parts) > 2:
+            event['message'] = parts[2]
+
+    allowed = ('key', 'state', 'message', 'metrics', 'series', 'host', 'env')
+    return {k: v for k, v in event.items() if k in allowed and v is not None}
+
+
+def stream_command(argv):
+    parser = argparse.ArgumentParser(prog="cronitor stream",
+                                     description='Read newline-delimited ping events from stdin or a FIFO '
+                                                 'and send them over a shared pool of connections.')
+    _add_auth_args(parser)
+    parser.add_argument('--input', '-i', type=str, default='-',
+                        help='File or FIFO to read events from. Defaults to stdin.')
+    parser.add_argument('--workers', '-w', type=int, default=4,
+                        help='Number of concurrent connections used to send pings')
+    args = parser.parse_args(argv)
+
+    with Client(api_key=args.apiKey, environment=args.env, workers=args.workers) as client:
+        dispatcher = client.dispatcher
+        if args.input == '-':
+            invalid = stream_events(sys.stdin, client)
+        else:
+            # A FIFO reaches EOF every time its last writer closes, so keep reopening it
+            follow = stat.S_ISFIFO(os.stat(args.input).st_mode)
+            invalid = 0
+            while True:
+                with open(args.input, 'r') as events:
+                    invalid += stream_events(events, client)
+                if not follow:
+                    break
+
+    return 0 if not (invalid or dispatcher.failed) else 1
+
+
+def stream_events(lines, client):
+    """Submit each event in lines to the client's dispatcher, returning the number of lines that could not be parsed."""
+    invalid = 0
+    monitors = {}
+    for line in lines:
+        try:
+            event = parse_event(line)
+        except ValueError as e:
+            print('Skipping invalid event {!r}: {}'.format(line.strip(), e), file=sys.stderr)
+            invalid += 1
+            continue
+        if event is None:
+            continue
+
+        key, env = event.pop('key'), event.pop('env', None)
+        monitor = monitors.get((key, env))
+        if monitor is None:
+            monitor = monitors[(key, env)] = client.Monitor(key, env=env)
+        client.dispatcher.submit(monitor, **event)
+    return invalid
+
+
+def exec_command(argv):
+    parser = argparse.ArgumentParser(prog="cronitor exec",
+                                     description='Run a command and report run, complete or fail events with its '
+                                                 'duration and exit code.')
+    _add_auth_args(parser)
+    parser.add_argument('key', type=str, help='Monitor key to report to')
+    parser.add_argument('command', nargs=argparse.REMAINDER, help='Command to run, optionally preceded by --')
+    args = parser.parse_args(argv)
+
+    command = args.command[1:] if args.command[:1] == ['--'] else args.command
+    if not command:
+        parser.error('a command to run is required')
+
+    monitor = Monitor(args.key, api_key=args.apiKey, env=args.env)
+    start = datetime.now().timestamp()
+    # monitoring must never stop the command from running or change its exit code
+    _safe_ping(monitor, state=cronitor.State.RUN, series=start)
+    try:
+        exit_code = subprocess.call(command)
+    except OSError as e:
+        print('cronitor: {}'.format(e), file=sys.stderr)
+        exit_code = 127
+
+    duration = datetime.now().timestamp() - start
+    state = cronitor.State.COMPLETE if exit_code == 0 else cronitor.State.FAIL
+    _safe_ping(monitor, state=state, message='Exited with code {}'.format(exit_code),
+               metrics={'duration': duration}, series=start)
+    return exit_code
+
+
+def _safe_ping(monitor, **params):
+    try:
+        monitor.ping(**params)
+    except requests.exceptions.RequestException as e:
+        print("cronitor: could not send '{}' event for '{}': {}".format(params.get('state'), monitor.key, e),
+              file=sys.stderr)
+
+
+def relay_command(argv):
+    parser = argparse.ArgumentParser(prog="cronitor relay",
+                                     description='Run a local relay that receives pings from processes on this host '
+                                                 'and sends them to Cronitor over pooled connections. Point clients '
+                                                 'at it with CRONITOR_RELAY_ADDRESS.')
+    parser.add_argument('--listen', '-l', type=str,
+                        default=os.getenv('CRONITOR_RELAY_ADDRESS', DEFAULT_ADDRESS),
+                        help='unix:///path/to.sock or udp://host:port to listen on (default: %(default)s)')
+    parser.add_argument('--workers', '-w', type=int, default=4,
+                        help='Number of concurrent connections used to send pings')
+    parser.add_argument('--spool', '-s', type=str, default=None,
+                        help='File to store undelivered pings in until they can be resent')
+    parser.add_argument('--retry-interval', type=int, default=30,
+                        help='Seconds between attempts to resend spooled pings')
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(levelname)s %(message)s')
+    server = RelayServer(args.listen, workers=args.workers, spool=args.spool, retry_interval=args.retry_interval)
+    signal.signal(signal.SIGTERM, lambda *_: server.stop())
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+COMMANDS = {
+    'stream': stream_command,
+    'exec': exec_command,
+    'relay': relay_command,
+}
 
 
 if __name__ == '__main__':
-    main()
+    sys.exit(main())
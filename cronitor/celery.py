@@ -14,7 +14,8 @@ try:
     import celery
     import celery.beat
     from celery.schedules import crontab, schedule, solar
-    from celery.signals import beat_init, task_prerun, task_failure, task_success, task_retry
+    from celery.signals import beat_init, task_prerun, task_postrun, task_failure, task_success, task_retry, \
+        task_revoked
 
     if typing.TYPE_CHECKING:
         from typing import Dict, List, Union, Optional, Tuple
@@ -32,6 +33,8 @@ ping_monitor_before_task = None
 ping_monitor_on_success = None
 ping_monitor_on_failure = None
 ping_monitor_on_retry = None
+stop_heartbeat_after_task = None
+stop_heartbeat_on_revoke = None
 
 
 def get_headers_from_task(task):  # type: (celery.Task) -> Dict
@@ -41,18 +44,37 @@ def get_headers_from_task(task):  # type: (celery.Task) -> Dict
     return headers
 
 
-def initialize(app, celerybeat_only=False, api_key=None):  # type: (celery.Celery, bool, Optional[str]) -> None
-    if api_key:
+def initialize(app, celerybeat_only=False, api_key=None, client=None, heartbeat=None):  # type: (celery.Celery, bool, Optional[str], Optional[cronitor.Client], Optional[float]) -> None
+    # a client carries its own api key, otherwise the key is set on the module configuration
+    if api_key and not client:
         cronitor.api_key = api_key
 
-    if celerybeat_only:
+    # pings and monitor syncs go through the given client, or the module configuration by default
+    monitor_class = client.Monitor if client else Monitor
+    # with a heartbeat interval, running tasks send progress pings, keyed here by task id
+    heartbeats = (client or cronitor.default_client).heartbeats
+    running = {}  # type: Dict[str, cronitor.heartbeat.Heartbeat]
+
+    def stop_heartbeat(task_id):  # type: (str) -> None
+        beat = running.pop(task_id, None)
+        if beat:
+            beat.stop()
+
+    # With a client the setting applies to this app only. Without one it stays on the module
+    # configuration, which is also read when tasks run, as it always has been.
+    if celerybeat_only and not client:
         cronitor.celerybeat_only = True
 
+    def beat_only():  # type: () -> bool
+        return celerybeat_only or (client is None and cronitor.celerybeat_only)
+
     global celerybeat_startup
     global ping_monitor_before_task
     global ping_monitor_on_success
     global ping_monitor_on_failure
     global ping_monitor_on_retry
+    global stop_heartbeat_after_task
+    global stop_heartbeat_on_revoke
 
     def celerybeat_startup(sender, **kwargs):  # type: (celery.beat.Service, Dict) -> None
         # To avoid recursion, since restarting celerybeat will result in this
@@ -79,8 +101,8 @@ def initialize(app, celerybeat_only=False, api_key=None):  # type: (celery.Celer
 
             item = entry.schedule  # type: celery.schedules.schedule
             if isinstance(item, crontab):
-                cronitor_schedule = ('{0._orig_minute} {0._orig_hour} {0._orig_day_of_week} {0._orig_day_of_month} '
-                                     '{0._orig_month_of_year}').format(item)
+                cronitor_schedule = ('{0._orig_minute} {0._orig_hour} {0._orig_day_of_month} {0._orig_month_of_year} '
+                                     '{0._orig_day_of_week}').format(item)
             elif isinstance(item, schedule):
                 freq = item.run_every  # type: datetime.timedelta
                 cronitor_schedule = 'every ' + humanize.precisedelta(freq)
@@ -138,7 +160,7 @@ def initialize(app, celerybeat_only=False, api_key=None):  # type: (celery.Celer
                 task()
 
         logger.debug("[Cronitor] creating monitors: %s", [m['key'] for m in monitors])
-        Monitor.put(monitors)
+        monitor_class.put(monitors)
 
     beat_init.connect(celerybeat_startup, dispatch_uid=1)
 
@@ -146,21 +168,24 @@ def initialize(app, celerybeat_only=False, api_key=None):  # type: (celery.Celer
     def ping_monitor_before_task(sender, **kwargs):  # type: (celery.Task, Dict) -> None
         headers = get_headers_from_task(sender)
         if 'x-cronitor-celerybeat-name' in headers:
-            monitor = Monitor(headers['x-cronitor-celerybeat-name'])
-        elif not cronitor.celerybeat_only:
-            monitor = Monitor(sender.name)
+            monitor = monitor_class(headers['x-cronitor-celerybeat-name'])
+        elif not beat_only():
+            monitor = monitor_class(sender.name)
         else:
             return
 
         monitor.ping(state=State.RUN, series=sender.request.id)
+        if heartbeat:
+            running[sender.request.id] = heartbeats.start(monitor, heartbeat, series=sender.request.id)
 
     @task_success.connect
     def ping_monitor_on_success(sender, **kwargs):  # type: (celery.Task, Dict) -> None
+        stop_heartbeat(sender.request.id)
         headers = get_headers_from_task(sender)
         if 'x-cronitor-celerybeat-name' in headers:
-            monitor = Monitor(headers['x-cronitor-celerybeat-name'])
-        elif not cronitor.celerybeat_only:
-            monitor = Monitor(sender.name)
+            monitor = monitor_class(headers['x-cronitor-celerybeat-name'])
+        elif not beat_only():
+            monitor = monitor_class(sender.name)
         else:
             return
 
@@ -176,11 +201,12 @@ def initialize(app, celerybeat_only=False, api_key=None):  # type: (celery.Celer
                                 einfo,  # type: billiard.einfo.ExceptionInfo
                                 **kwargs2  # type: Dict
                                 ):
+        stop_heartbeat(sender.request.id)
         headers = get_headers_from_task(sender)
         if 'x-cronitor-celerybeat-name' in headers:
-            monitor = Monitor(headers['x-cronitor-celerybeat-name'])
-        elif not cronitor.celerybeat_only:
-            monitor = Monitor(sender.name)
+            monitor = monitor_class(headers['x-cronitor-celerybeat-name'])
+        elif not beat_only():
+            monitor = monitor_class(sender.name)
         else:
             return
 
@@ -193,12 +219,24 @@ def initialize(app, celerybeat_only=False, api_key=None):  # type: (celery.Celer
                               einfo,  # type: billiard.einfo.ExceptionInfo
                               **kwargs,  # type: Dict
                               ):
+        stop_heartbeat(sender.request.id)
         headers = get_headers_from_task(sender)
         if 'x-cronitor-celerybeat-name' in headers:
-            monitor = Monitor(headers['x-cronitor-celerybeat-name'])
-        elif not cronitor.celerybeat_only:
-            monitor = Monitor(sender.name)
+            monitor = monitor_class(headers['x-cronitor-celerybeat-name'])
+        elif not beat_only():
+            monitor = monitor_class(sender.name)
         else:
             return
 
         monitor.ping(state=State.FAIL, series=sender.request.id, message=str(reason))
+
+    # postrun fires however the task ended and revoked covers tasks that were terminated,
+    # so no heartbeat is left running for a task that is gone
+    @task_postrun.connect
+    def stop_heartbeat_after_task(sender, task_id=None, **kwargs):  # type: (celery.Task, Optional[str], Dict) -> None
+        stop_heartbeat(task_id or sender.request.id)
+
+    @task_revoked.connect
+    def stop_heartbeat_on_revoke(sender, request=None, **kwargs):  # type: (celery.Task, Optional[Request], Dict) -> None
+        if request is not None:
+            stop_heartbeat(request.id)
@@ -0,0 +1,114 @@
+import threading
+
+import cronitor
+from .dedup import RecentEvents
+from .dispatch import Dispatcher
+from .heartbeat import HeartbeatScheduler
+from .monitor import Monitor, API_RATE_LIMIT, retry_session
+from .ratelimit import TokenBucket
+from .schedule import Watchdog
+from .sync import MonitorSync
+
+
+class Client(object):
+    """
+    Configuration and connection state for one Cronitor account or environment. Each client has
+    its own connection pool, API rate limiter, ping dispatcher and duplicate-event cache, and a
+    `Monitor` class bound to them, so several accounts can be used concurrently from one process:
+
+        tenant = cronitor.Client(api_key='apiKey123', environment='staging')
+        tenant.Monitor('nightly-backup').ping(state='complete')
+
+    Settings that are not given fall back to the module configuration, e.g. cronitor.api_key.
+    """
+
+    def __init__(self, api_key=None, api_version=None, environment=None, timeout=None,
+                 relay_address=None, compress_requests=None, rate_limit=API_RATE_LIMIT, workers=4,
+                 monitor_class=None):
+        self._api_key = api_key
+        self._api_version = api_version
+        self._environment = environment
+        self._timeout = timeout
+        self._relay_address = relay_address
+        self._compress_requests = compress_requests
+        self.workers = workers
+
+        self.session = retry_session(retries=3)
+        self.stream_session = retry_session(retries=0)
+        self.limiter = TokenBucket(rate_limit)
+        self.recent = RecentEvents(maxsize=10000, ttl=3600)
+        self._dispatcher = None
+        self._lock = threading.Lock()
+
+        # the default client binds the Monitor class itself, any other client binds a subclass
+        self.Monitor = monitor_class or type('Monitor', (Monitor,), {})
+        self.Monitor._client = self
+        self.Monitor._req = self.session
+        self.Monitor._stream_req = self.stream_session
+        self.Monitor._limiter = self.limiter
+        self.Monitor._recent = self.recent
+
+        # attributes registered with cronitor.job(..., client=this client)
+        self.sync = MonitorSync(self.Monitor)
+        # local missed-run and overrun detection for jobs registered with a schedule
+        self.watchdog = Watchdog()
+        # progress pings for long-running jobs, sent through the dispatcher
+        self.heartbeats = HeartbeatScheduler(self._send_heartbeat)
+
+    @property
+    def api_key(self):
+        return self._setting(self._api_key, 'api_key')
+
+    @property
+    def api_version(self):
+        return self._setting(self._api_version, 'api_version')
+
+    @property
+    def environment(self):
+        return self._setting(self._environment, 'environment')
+
+    @property
+    def timeout(self):
+        return self._setting(self._timeout, 'timeout')
+
+    @property
+    def relay_address(self):
+        return self._setting(self._relay_address, 'relay_address')
+
+    @property
+    def compress_requests(self):
+        return self._setting(self._compress_requests, 'compress_requests')
+
+    @property
+    def dispatcher(self):
+        """A Dispatcher that sends pings in the background over this client's connection pool."""
+        with self._lock:
+            if self._dispatcher is None:
+                self._dispatcher = Dispatcher(workers=self.workers)
+            return self._dispatcher
+
+    def _send_heartbeat(self, beat, params):
+        self.dispatcher.submit_heartbeat(beat, **params)
+
+    def close(self):
+        """Send any pings still queued on the dispatcher and close pooled connections."""
+        with self._lock:
+            dispatcher, self._dispatcher = self._dispatcher, None
+        if dispatcher:
+            dispatcher.close()
+        self.session.close()
+        self.stream_session.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    @staticmethod
+    def _setting(value, name):
+        return value if value is not None else getattr(cronitor, name)
+
+
+# the client used by cronitor.Monitor, configured through the module variables
+default_client = Client(monitor_class=Monitor)
@@ -0,0 +1,59 @@
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+
+def event_id(key, state, series, env=None, api_key=None):
+    """
+    A stable id for the event `state` of run `series` on monitor `key`, used as its idempotency key.
+    The same run reported to another environment or account gets a different id.
+    """
+    raw = '\x1f'.join(str(part) for part in (api_key or '', env or '', key, state or '', series))
+    return hashlib.sha1(raw.encode('utf-8')).hexdigest()
+
+
+class RecentEvents(object):
+    """
+    A bounded set of recently seen event ids. Ids expire after `ttl` seconds and the
+    oldest ids are evicted once `maxsize` is reached, so memory stays flat at any volume.
+    """
+
+    def __init__(self, maxsize=10000, ttl=300):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._events = OrderedDict()
+        self._lock = threading.Lock()
+
+    def seen(self, event_id):
+        """Record event_id, returning True if it was already recorded within the ttl."""
+        now = time.monotonic()
+        with self._lock:
+            self._evict(now)
+            if event_id in self._events:
+                return True
+            self._events[event_id] = now + self.ttl
+            if len(self._events) > self.maxsize:
+                self._events.popitem(last=False)
+            return False
+
+    def forget(self, event_id):
+        with self._lock:
+            self._events.pop(event_id, None)
+
+    def clear(self):
+        with self._lock:
+            self._events.clear()
+
+    def __len__(self):
+        with self._lock:
+            self._evict(time.monotonic())
+            return len(self._events)
+
+    def _evict(self, now):
+        # ids are inserted in expiry order, so expired ids are always at the front
+        while self._events:
+            event_id, expires = next(iter(self._events.items()))
+            if expires > now:
+                break
+            del self._events[event_id]
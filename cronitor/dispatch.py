@@ -0,0 +1,108 @@
+import logging
+import queue
+import threading
+
+import requests
+
+logger = logging.getLogger(__name__)
+
+
+class Dispatcher(object):
+    """
+    Sends pings from a small pool of worker threads. Every worker shares the pooled
+    keep-alive session on Monitor, so a long stream of events reuses a handful of
+    connections instead of opening one per ping.
+
+    If given, `on_failure(monitor, params)` is called for pings that could not be
+    delivered because of a connection error or a server error, so they can be retried.
+    """
+
+    def __init__(self, workers=4, maxsize=10000, on_failure=None):
+        self.workers = workers
+        self.on_failure = on_failure
+        self.sent = 0
+        self.failed = 0
+        self._queue = queue.Queue(maxsize)
+        self._threads = []
+        self._lock = threading.Lock()
+
+    def submit(self, monitor, **params):
+        self._start()
+        self._queue.put((monitor, params, None))
+
+    def submit_heartbeat(self, beat, **params):
+        """
+        Queue a Monitor.heartbeat call for a running Heartbeat. Unlike a ping it is never deduplicated,
+        and it is dropped if the heartbeat is stopped before it is sent.
+        """
+        self._start()
+        self._queue.put((beat.monitor, params, beat))
+
+    def join(self):
+        """Block until every submitted ping has been sent or has failed."""
+        self._queue.join()
+
+    def close(self):
+        self.join()
+        with self._lock:
+            threads, self._threads = self._threads, []
+        for _ in threads:
+            self._queue.put(None)
+        for thread in threads:
+            thread.join()
+
+    def _start(self):
+        with self._lock:
+            while len(self._threads) < self.workers:
+                thread = threading.Thread(target=self._run, daemon=True)
+                thread.start()
+                self._threads.append(thread)
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            try:
+                if item is None:
+                    return
+                self._send(*item)
+            except Exception:
+                # one bad send must never stop a worker, or join() would wait on its queue forever
+                logger.exception('Unexpected error sending ping')
+                with self._lock:
+                    self.failed += 1
+            finally:
+                self._queue.task_done()
+
+    def _send(self, monitor, params, beat):
+        try:
+            if beat is None:
+                resp = monitor.ping(**params)
+            else:
+                # Heartbeat.stop waits on this lock, so a beat is either sent before the job's final
+                # ping or not at all
+                with beat.sending:
+                    if beat.cancelled:
+                        return
+                    resp = monitor.heartbeat(**params)
+            ok = resp is not None and resp.ok
+            undelivered = not ok and resp is not None and resp.status_code >= 500
+        except requests.exceptions.RequestException as e:
+            logger.error("Could not send ping for '%s': %s", monitor.key, e)
+            ok = False
+            undelivered = True
+
+        # a lost heartbeat is superseded by the next one, so only pings are handed back for retry
+        if undelivered and self.on_failure and beat is None:
+            self.on_failure(monitor, params)
+
+        with self._lock:
+            if ok:
+                self.sent += 1
+            else:
+                self.failed += 1
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
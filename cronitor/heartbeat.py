@@ -0,0 +1,122 @@
+import heapq
+import itertools
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# rebuild the heap once cancelled entries outnumber live ones and there are at least this many
+COMPACT_THRESHOLD = 64
+
+
+class Heartbeat(object):
+    """A handle for one running job's heartbeat, returned by HeartbeatScheduler.start."""
+
+    __slots__ = ('monitor', 'interval', 'params', 'started', 'count', 'cancelled', 'sending', '_scheduler')
+
+    def __init__(self, scheduler, monitor, interval, params):
+        self.monitor = monitor
+        self.interval = interval
+        self.params = params
+        self.started = time.monotonic()
+        self.count = 0
+        self.cancelled = False
+        # held while a beat is being sent, see Dispatcher.submit_heartbeat
+        self.sending = threading.Lock()
+        self._scheduler = scheduler
+
+    def stop(self):
+        self._scheduler.stop(self)
+        # wait out a beat already being sent, so none can arrive after the job's final ping
+        with self.sending:
+            pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+class HeartbeatScheduler(object):
+    """
+    Sends periodic heartbeats for long-running jobs from a single background thread. Every active
+    heartbeat sits in one heap ordered by its next due time, so the thread sleeps until the earliest
+    one and the cost of each beat is O(log n) however many jobs are running. Beats are handed to
+    `send(beat, params)`, e.g. a Dispatcher, so a slow request never delays the others.
+
+    Stopping a heartbeat only marks it cancelled; it is dropped when it next comes due, or sooner
+    when cancelled entries make up most of the heap.
+    """
+
+    def __init__(self, send):
+        self.send = send
+        self._heap = []
+        self._seq = itertools.count()
+        self._cancelled = 0
+        self._cond = threading.Condition()
+        self._thread = None
+
+    def start(self, monitor, interval, **params):
+        """Send monitor.heartbeat(**params) every `interval` seconds until the returned handle is stopped."""
+        if interval <= 0:
+            raise ValueError('Heartbeat interval must be positive, got {}'.format(interval))
+
+        beat = Heartbeat(self, monitor, interval, params)
+        with self._cond:
+            heapq.heappush(self._heap, (beat.started + interval, next(self._seq), beat))
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, daemon=True)
+                self._thread.start()
+            if self._heap[0][2] is beat:
+                self._cond.notify()
+        return beat
+
+    def stop(self, beat):
+        with self._cond:
+            if beat.cancelled:
+                return
+            beat.cancelled = True
+            self._cancelled += 1
+            if self._cancelled >= COMPACT_THRESHOLD and self._cancelled * 2 > len(self._heap):
+                self._heap = [entry for entry in self._heap if not entry[2].cancelled]
+                heapq.heapify(self._heap)
+                self._cancelled = 0
+
+    def __len__(self):
+        with self._cond:
+            return len(self._heap) - self._cancelled
+
+    def due(self, now=None):
+        """Pop and reschedule every heartbeat due at `now`, returning (heartbeat, params) pairs to send."""
+        now = time.monotonic() if now is None else now
+        beats = []
+        with self._cond:
+            while self._heap and self._heap[0][0] <= now:
+                due, _, beat = heapq.heappop(self._heap)
+                if beat.cancelled:
+                    self._cancelled -= 1
+                    continue
+
+                beat.count += 1
+                elapsed = now - beat.started
+                beats.append((beat, dict(beat.params, message='Still running after {:.0f} seconds'.format(elapsed))))
+                # beats missed while the process was stalled are skipped rather than sent in a burst
+                next_due = due + beat.interval
+                if next_due <= now:
+                    next_due = now + beat.interval
+                heapq.heappush(self._heap, (next_due, next(self._seq), beat))
+        return beats
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._heap or self._heap[0][0] > time.monotonic():
+                    self._cond.wait(self._heap[0][0] - time.monotonic() if self._heap else None)
+
+            for beat, params in self.due():
+                try:
+                    self.send(beat, params)
+                except Exception as e:
+                    logger.error("Could not send heartbeat for '%s': %s", beat.monitor.key, e)
@@ -3,24 +3,39 @@ import yaml
 import logging
 import json
 import os
+import zlib
 import requests
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from yaml.loader import SafeLoader
 
 
 import cronitor
+from .dedup import event_id
+from .ratelimit import TokenBucket, retry_after
 from urllib3.util.retry import Retry
 from requests.adapters import HTTPAdapter
 
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
 logger = logging.getLogger(__name__)
 
 # https://stackoverflow.com/questions/49121365/implementing-retry-for-requests-in-python
 def retry_session(retries, session=None, backoff_factor=0.3):
     session = session or requests.Session()
+    # Only connection and read errors are retried here. Throttling (429/503 and Retry-After) is
+    # left to Monitor._api_request, which waits through the shared rate limiter instead.
     retry = Retry(
         total=retries,
         read=retries,
         connect=retries,
+        status=0,
         backoff_factor=backoff_factor,
+        respect_retry_after_header=False,
+        raise_on_status=False,
     )
     adapter = HTTPAdapter(max_retries=retry)
     session.mount('http://', adapter)
@@ -30,30 +45,142 @@ def retry_session(retries, session=None, backoff_factor=0.3):
 JSON = 'json'
 YAML = 'yaml'
 
+# requests per second made to the monitor API by all threads combined
+API_RATE_LIMIT = 10
+# attempts made for a monitor API request that is throttled with a 429 or 503
+API_ATTEMPTS = 5
+# size of the chunks request bodies are streamed in
+CHUNK_SIZE = 64 * 1024
+# request bodies larger than this many bytes are streamed with chunked transfer encoding
+STREAM_THRESHOLD = 1024 * 1024
+
 class Monitor(object):
     _headers = {
         'User-Agent': 'cronitor-python',
     }
 
-    _req = retry_session(retries=3)
+    # Set when the class is bound to a cronitor.Client, which provides configuration and:
+    #   _req: the pooled, retrying session used for every request
+    #   _stream_req: a session without transport retries, for streamed bodies that cannot be rewound
+    #   _recent: ids of recently sent run/complete/fail events, used to drop duplicates of the same series
+    #   _limiter: shared by every monitor API request so concurrent callers slow down together when throttled
+    _client = None
+    _req = None
+    _stream_req = None
+    _recent = None
+    _limiter = None
 
     @classmethod
     def as_yaml(cls, api_key=None, api_version=None):
-        timeout = cronitor.timeout or 10
-        api_key = api_key or cronitor.api_key
-        resp = cls._req.get('%s.yaml' % cls._monitor_api_url(),
-                        auth=(api_key, ''),
-                        headers=dict(cls._headers, **{'Content-Type': 'application/yaml', 'Cronitor-Version': api_version}),
-                        timeout=timeout)
+        api_key = api_key or cls._client.api_key
+        resp = cls._api_request('get', '%s.yaml' % cls._monitor_api_url(), api_key,
+                        headers=dict(cls._headers, **{'Content-Type': 'application/yaml', 'Cronitor-Version': api_version}))
         if resp.status_code == 200:
             return resp.text
         else:
             raise cronitor.APIError("Unexpected error %s" % resp.text)
 
+    @classmethod
+    def list(cls, type=None, group=None, env=None, tag=None, workers=4, api_key=None, api_version=None):
+        """
+        Lazily yield every monitor matching the filters. The first page is read to learn how many
+        pages there are, then the rest are fetched `workers` at a time and yielded in order.
+        `type` and `tag` may be a single value or a list.
+        """
+        api_key = api_key or cls._client.api_key
+        api_version = api_version or cls._client.api_version
+        filters = {'type': type, 'group': group, 'env': env, 'tag': tag}
+        filters = {k: v for k, v in filters.items() if v is not None}
+
+        first = cls._fetch_page(1, filters, api_key, api_version)
+        for md in first.get('monitors', []):
+            yield cls._from_data(md, api_key, api_version)
+
+        page_size = first.get('page_size') or len(first.get('monitors', []))
+        total = first.get('total_monitor_count')
+        if not page_size or total is None:
+            # without a count, page sequentially until a page comes back short
+            page = 1
+            data = first
+            while page_size and len(data.get('monitors', [])) >= page_size:
+                page += 1
+                data = cls._fetch_page(page, filters, api_key, api_version)
+                for md in data.get('monitors', []):
+                    yield cls._from_data(md, api_key, api_version)
+            return
+
+        pages = range(2, -(-total // page_size) + 1)
+        fetch = lambda page: cls._fetch_page(page, filters, api_key, api_version)
+        for data in _imap(fetch, pages, workers):
+            for md in data.get('monitors', []):
+                yield cls._from_data(md, api_key, api_version)
+
+    @classmethod
+    def get_many(cls, keys, workers=8, skip_missing=False, api_key=None, api_version=None):
+        """
+        Lazily yield a Monitor with its data loaded for each key, fetching up to `workers` at a time.
+        Raises MonitorNotFound for a missing key unless `skip_missing` is set.
+        """
+        api_key = api_key or cls._client.api_key
+        api_version = api_version or cls._client.api_version
+
+        def fetch(key):
+            try:
+                return cls._fetch_monitor(key, api_key, api_version)
+            except cronitor.MonitorNotFound:
+                if not skip_missing:
+                    raise
+                logger.warning("Monitor '%s' not found", key)
+
+        for md in _imap(fetch, keys, workers):
+            if md is not None:
+                yield cls._from_data(md, api_key, api_version)
+
+    @classmethod
+    def pause_many(cls, keys=None, hours=24, **options):
+        """
+        Pause many monitors at once. Monitors are chosen by `keys` or by the `type`, `group`, `env`
+        and `tag` filters accepted by Monitor.list. Requests run `workers` at a time within the shared
+        API rate limit, optionally capped further at `rate_limit` requests per second. Returns a dict
+        mapping each key to True or the exception raised.
+        """
+        return cls._bulk(lambda key, api_key: cls._pause_monitor(key, hours, api_key), keys, **options)
+
+    @classmethod
+    def unpause_many(cls, keys=None, **options):
+        """Unpause many monitors at once. Accepts the same options as pause_many."""
+        return cls.pause_many(keys, hours=0, **options)
+
+    @classmethod
+    def delete_many(cls, keys=None, **options):
+        """Delete many monitors at once. Accepts the same options as pause_many."""
+        return cls._bulk(cls._delete_monitor, keys, **options)
+
+    @classmethod
+    def _bulk(cls, action, keys=None, type=None, group=None, env=None, tag=None,
+              workers=4, rate_limit=None, api_key=None):
+        api_key = api_key or cls._client.api_key
+        if keys is None:
+            if not any([type, group, env, tag]):
+                raise ValueError('Provide monitor keys or at least one of type, group, env or tag')
+            keys = [m.key for m in cls.list(type=type, group=group, env=env, tag=tag, api_key=api_key)]
+
+        limiter = TokenBucket(rate_limit) if rate_limit else None
+
+        def run(key):
+            if limiter:
+                limiter.acquire()
+            try:
+                return key, action(key, api_key)
+            except (cronitor.MonitorNotFound, cronitor.APIError, requests.exceptions.RequestException) as e:
+                return key, e
+
+        return dict(_imap(run, keys, workers))
+
     @classmethod
     def put(cls, monitors=None, **kwargs):
-        api_key = cronitor.api_key
-        api_version = cronitor.api_version
+        api_key = cls._client.api_key
+        api_version = cls._client.api_version
         request_format = JSON
 
         rollback = False
@@ -88,38 +215,42 @@ class Monitor(object):
 
     @classmethod
     def _put(cls, monitors, api_key, rollback, request_format, api_version):
-        timeout = cronitor.timeout or 10
         payload = _prepare_payload(monitors, rollback, request_format)
+        compress = cls._client.compress_requests
+        headers = {'Cronitor-Version': api_version, 'Accept-Encoding': 'gzip'}
+        if compress:
+            headers['Content-Encoding'] = 'gzip'
         if request_format == YAML:
-            content_type = 'application/yaml'
-            data = yaml.dump(payload)
+            headers['Content-Type'] = 'application/yaml'
             url = '{}.yaml'.format(cls._monitor_api_url())
         else:
-            content_type = 'application/json'
-            data = json.dumps(payload)
+            headers['Content-Type'] = 'application/json'
             url = cls._monitor_api_url()
 
-        resp = cls._req.put(url,
-                        auth=(api_key, ''),
-                        data=data,
-                        headers=dict(cls._headers, **{'Content-Type': content_type, 'Cronitor-Version': api_version}),
-                        timeout=timeout)
+        resp = cls._api_request('put', url, api_key,
+                        data=_request_body(payload, request_format, compress),
+                        headers=dict(cls._headers, **headers),
+                        stream=True)
 
         if resp.status_code == 200:
             if request_format == YAML:
-                return yaml.load(resp.text, Loader=SafeLoader)
+                # parse straight from the (decompressing) response stream
+                resp.raw.decode_content = True
+                return yaml.load(resp.raw, Loader=SafeLoader)
             else:
-                return resp.json().get('monitors', [])
+                return _json_response(resp).get('monitors', [])
         elif resp.status_code == 400:
             raise cronitor.APIValidationError(resp.text)
         else:
             raise cronitor.APIError("Unexpected error %s" % resp.text)
 
-    def __init__(self, key, api_key=None, api_version=None, env=None):
+    def __init__(self, key, api_key=None, api_version=None, env=None, relay_address=None):
         self.key = key
-        self.api_key = api_key or cronitor.api_key
-        self.api_verion = api_version or cronitor.api_version
-        self.env = env or cronitor.environment
+        self.api_key = api_key or self._client.api_key
+        self.api_verion = api_version or self._client.api_version
+        self.env = env or self._client.environment
+        # pass relay_address='' to always send pings directly, even if cronitor.relay_address is set
+        self.relay_address = self._client.relay_address if relay_address is None else relay_address
         self._data = None
 
     @property
@@ -135,25 +266,51 @@ class Monitor(object):
         self._data = Struct(**data)
 
     def delete(self):
-        resp = requests.delete(
-                    self._monitor_api_url(self.key),
-                    auth=(self.api_key, ''),
-                    headers=self._headers,
-                    timeout=10)
-
-        if resp.status_code == 204:
-            return True
-        elif resp.status_code == 404:
-            raise cronitor.MonitorNotFound("Monitor '%s' not found" % self.key)
-        else:
-            raise cronitor.APIError("An unexpected error occured when deleting '%s'" % self.key)
+        return self._delete_monitor(self.key, self.api_key)
 
     def ping(self, **params):
         if not self.api_key:
             logger.error('No API key detected. Set cronitor.api_key or initialize Monitor with kwarg api_key.')
             return
 
-        return self._req.get(url=self._ping_api_url(), params=self._clean_params(params), timeout=5, headers=self._headers)
+        if self.relay_address and self._relay(params):
+            return Accepted('relayed')
+
+        # Events that belong to a series are sent at most once. The id doubles as an idempotency key
+        # so the server can discard a resend after a response was lost.
+        headers = self._headers
+        eid = None
+        if params.get('series') is not None:
+            eid = event_id(self.key, params.get('state'), params['series'], env=self.env, api_key=self.api_key)
+            if self._recent.seen(eid):
+                logger.debug("Skipping duplicate '%s' event for '%s' in series %s", params.get('state'), self.key, params['series'])
+                return Accepted('duplicate')
+            headers = dict(self._headers, **{'Idempotency-Key': eid})
+
+        try:
+            resp = self._send(params, headers)
+        except requests.exceptions.RequestException:
+            if eid:
+                self._recent.forget(eid)
+            raise
+
+        if eid and not resp.ok and resp.status_code >= 500:
+            self._recent.forget(eid)
+        return resp
+
+    def heartbeat(self, **params):
+        """
+        Report that a run is still in progress. Heartbeats are `run` events that are sent straight to
+        the API every time, never deduplicated or relayed, so repeats within one series all arrive.
+        """
+        if not self.api_key:
+            logger.error('No API key detected. Set cronitor.api_key or initialize Monitor with kwarg api_key.')
+            return
+
+        return self._send(dict(params, state=cronitor.State.RUN), self._headers)
+
+    def _send(self, params, headers):
+        return self._req.get(url=self._ping_api_url(), params=self._clean_params(params), timeout=5, headers=headers)
 
     def ok(self):
         self.ping(state=cronitor.State.OK)
@@ -163,23 +320,122 @@ class Monitor(object):
             logger.error('No API key detected. Set cronitor.api_key or initialize Monitor with kwarg api_key.')
             return
 
-        return self._req.get(url='{}/pause/{}'.format(self._monitor_api_url(self.key), hours), auth=(self.api_key, ''), timeout=5, headers=self._headers)
+        return self._api_request('get', '{}/pause/{}'.format(self._monitor_api_url(self.key), hours), self.api_key, timeout=5, headers=self._headers)
 
     def unpause(self):
         return self.pause(0)
 
+    @classmethod
+    def _delete_monitor(cls, key, api_key):
+        resp = cls._api_request('delete', cls._monitor_api_url(key), api_key, headers=cls._headers)
+
+        if resp.status_code == 204:
+            return True
+        elif resp.status_code == 404:
+            raise cronitor.MonitorNotFound("Monitor '%s' not found" % key)
+        else:
+            raise cronitor.APIError("An unexpected error occured when deleting '%s'" % key)
+
+    @classmethod
+    def _pause_monitor(cls, key, hours, api_key):
+        resp = cls._api_request('get', '{}/pause/{}'.format(cls._monitor_api_url(key), hours), api_key, timeout=5, headers=cls._headers)
+
+        if resp.status_code == 200:
+            return True
+        elif resp.status_code == 404:
+            raise cronitor.MonitorNotFound("Monitor '%s' not found" % key)
+        else:
+            raise cronitor.APIError("An unexpected error occured when pausing '%s'" % key)
+
     def _fetch(self):
-        if not self.api_key:
+        return self._fetch_monitor(self.key, self.api_key, self.api_verion)
+
+    @classmethod
+    def _fetch_monitor(cls, key, api_key, api_version):
+        if not api_key:
+            raise cronitor.AuthenticationError('No api_key detected. Set cronitor.api_key or initialize Monitor with kwarg.')
+
+        resp = cls._api_request('get', cls._monitor_api_url(key), api_key,
+                            headers=dict(cls._headers, **{'Content-Type': 'application/json', 'Cronitor-Version': api_version}))
+
+        if resp.status_code == 200:
+            return resp.json()
+        elif resp.status_code == 404:
+            raise cronitor.MonitorNotFound("Monitor '%s' not found" % key)
+        else:
+            raise cronitor.APIError("Unexpected error %s" % resp.text)
+
+    @classmethod
+    def _fetch_page(cls, page, filters, api_key, api_version):
+        if not api_key:
             raise cronitor.AuthenticationError('No api_key detected. Set cronitor.api_key or initialize Monitor with kwarg.')
 
-        resp = requests.get(self._monitor_api_url(self.key),
-                            timeout=10,
-                            auth=(self.api_key, ''),
-                            headers=dict(self._headers, **{'Content-Type': 'application/json', 'Cronitor-Version': self.api_verion}))
+        resp = cls._api_request('get', cls._monitor_api_url(), api_key,
+                            params=dict(filters, page=page),
+                            headers=dict(cls._headers, **{'Content-Type': 'application/json', 'Cronitor-Version': api_version}))
+
+        if resp.status_code == 200:
+            return resp.json()
+        else:
+            raise cronitor.APIError("Unexpected error %s" % resp.text)
+
+    @classmethod
+    def _api_request(cls, method, url, api_key, timeout=None, **kwargs):
+        """
+        Make a monitor API request through the shared rate limiter. A 429 or 503 response throttles
+        every caller for the Retry-After period (or an exponential backoff) before retrying. Raises
+        RateLimitError if the API is still throttling after API_ATTEMPTS attempts.
+        """
+        timeout = timeout or cls._client.timeout or 10
+        body = kwargs.pop('data', None)
+        # A body factory produces a stream the transport cannot rewind, so the request is sent without
+        # transport retries and a dropped connection is retried here with a freshly created body.
+        streamed = callable(body)
+        session = cls._stream_req if streamed else cls._req
+        for attempt in range(API_ATTEMPTS):
+            if body is not None:
+                kwargs['data'] = body() if streamed else body
+            cls._limiter.acquire()
+            try:
+                resp = getattr(session, method)(url, auth=(api_key, ''), timeout=timeout, **kwargs)
+            except (requests.exceptions.ConnectionError, requests.exceptions.ChunkedEncodingError) as e:
+                if not streamed or attempt == API_ATTEMPTS - 1:
+                    raise
+                delay = 0.5 * 2 ** attempt
+                logger.warning('Monitor API request failed (%s), retrying in %.1fs', e, delay)
+                time.sleep(delay)
+                continue
+
+            if resp.status_code not in (429, 503):
+                cls._limiter.recover()
+                return resp
+
+            delay = retry_after(resp, default=0.5 * 2 ** attempt)
+            logger.warning('Monitor API returned %s, retrying in %.1fs', resp.status_code, delay)
+            cls._limiter.throttle(delay)
+            if attempt < API_ATTEMPTS - 1:
+                # release the connection of a streamed response before it is retried
+                resp.close()
+
+        if resp.status_code == 429:
+            raise cronitor.RateLimitError('Rate limit exceeded after {} attempts'.format(API_ATTEMPTS))
+        return resp
 
-        if resp.status_code == 404:
-            raise cronitor.MonitorNotFound("Monitor '%s' not found" % self.key)
-        return resp.json()
+    @classmethod
+    def _from_data(cls, data, api_key=None, api_version=None):
+        monitor = cls(data['key'], api_key=api_key, api_version=api_version)
+        monitor.data = data
+        return monitor
+
+    def _relay(self, params):
+        from . import relay
+        event = dict(params, key=self.key, api_key=self.api_key, env=self.env, stamp=params.get('stamp') or time.time())
+        try:
+            relay.send(self.relay_address, event)
+            return True
+        except (OSError, ValueError) as e:
+            logger.warning("Could not hand off ping to relay at '%s', sending directly: %s", self.relay_address, e)
+            return False
 
     def _clean_params(self, params):
         metrics = None
@@ -192,7 +448,7 @@ class Monitor(object):
             'series': params.get('series', None),
             'host': params.get('host', os.getenv('COMPUTERNAME', None)),
             'metric': metrics,
-            'stamp': time.time(),
+            'stamp': params.get('stamp') or time.time(),
             'env': self.env,
         }
 
@@ -204,6 +460,100 @@ class Monitor(object):
         if not key: return "https://cronitor.io/api/monitors"
         return "https://cronitor.io/api/monitors/{}".format(key)
 
+def _imap(func, iterable, workers):
+    """
+    Like map(), but calls func from a pool of `workers` threads. Results are yielded in order
+    and at most `workers` calls are in flight, so a lazy consumer never buffers more than that.
+    """
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        pending = deque()
+        try:
+            for item in iterable:
+                pending.append(executor.submit(func, item))
+                if len(pending) >= workers:
+                    yield pending.popleft().result()
+            while pending:
+                yield pending.popleft().result()
+        finally:
+            for future in pending:
+                future.cancel()
+
+
+def _encode_body(payload, request_format=JSON, compress=False):
+    """
+    Yield the encoded request body in chunks, gzipped if `compress` is set. JSON is encoded one
+    monitor at a time, with orjson when it is installed and otherwise incrementally with the
+    standard library encoder, so the full uncompressed document is never built as one string.
+    YAML is the exception and is encoded in one piece.
+    """
+    if request_format == YAML:
+        chunks = [yaml.dump(payload).encode('utf-8')]
+    elif orjson is not None:
+        chunks = _buffered(_orjson_parts(payload))
+    else:
+        chunks = _buffered(part.encode('utf-8') for part in json.JSONEncoder().iterencode(payload))
+
+    if not compress:
+        yield from chunks
+        return
+
+    gzip = zlib.compressobj(wbits=zlib.MAX_WBITS | 16)
+    for chunk in chunks:
+        data = gzip.compress(chunk)
+        if data:
+            yield data
+    yield gzip.flush()
+
+
+def _request_body(payload, request_format=JSON, compress=False):
+    """
+    The encoded body for payload. Bodies up to STREAM_THRESHOLD bytes are returned as bytes and
+    sent with a Content-Length. Larger ones are returned as a factory of chunk generators, so the
+    body is streamed and can be produced again if the request has to be retried.
+    """
+    head, size = [], 0
+    for chunk in _encode_body(payload, request_format, compress):
+        head.append(chunk)
+        size += len(chunk)
+        if size > STREAM_THRESHOLD:
+            return lambda: _encode_body(payload, request_format, compress)
+    return b''.join(head)
+
+
+def _orjson_parts(payload):
+    """Encode a payload dict with orjson, a list item at a time, so only one monitor is encoded at once."""
+    yield b'{'
+    for i, (name, value) in enumerate(payload.items()):
+        yield (b',' if i else b'') + orjson.dumps(name) + b':'
+        if isinstance(value, list):
+            yield b'['
+            for j, item in enumerate(value):
+                yield (b',' if j else b'') + orjson.dumps(item)
+            yield b']'
+        else:
+            yield orjson.dumps(value)
+    yield b'}'
+
+
+def _buffered(parts):
+    """Join the many small encoded parts of a body into CHUNK_SIZE byte chunks."""
+    buffer, size = [], 0
+    for part in parts:
+        buffer.append(part)
+        size += len(part)
+        if size >= CHUNK_SIZE:
+            yield b''.join(buffer)
+            buffer, size = [], 0
+    if buffer:
+        yield b''.join(buffer)
+
+
+def _json_response(resp):
+    if orjson is not None:
+        return orjson.loads(resp.content)
+    return resp.json()
+
+
 def _prepare_payload(monitors, rollback=False, request_format=JSON):
     ret = {}
     if request_format == JSON:
@@ -215,6 +565,23 @@ def _prepare_payload(monitors, rollback=False, request_format=JSON):
     return ret
 
 
+class Accepted(object):
+    """
+    Returned by Monitor.ping in place of a requests.Response when the ping was not sent directly,
+    because it was handed off to a relay or was a duplicate of an event already sent. Like a
+    response, it has `ok` and `status_code`.
+    """
+    ok = True
+    status_code = 202
+    text = ''
+
+    def __init__(self, reason):
+        self.reason = reason
+
+    def __repr__(self):
+        return '<Accepted [{}]>'.format(self.reason)
+
+
 class Struct(object):
     def __init__(self, **kwargs):
         self.__dict__.update(kwargs)
@@ -0,0 +1,67 @@
+import email.utils
+import threading
+import time
+
+
+class TokenBucket(object):
+    """
+    A thread-safe token bucket. `acquire()` blocks until a token is available, allowing
+    `rate` calls per second on average with bursts of up to `burst` calls.
+
+    The rate adapts to throttling: `throttle(delay)` holds every caller for `delay` seconds
+    and halves the rate, and each `recover()` after a successful call raises it back
+    towards the configured maximum.
+    """
+
+    def __init__(self, rate, burst=None, min_rate=None):
+        self.max_rate = float(rate)
+        self.min_rate = float(min_rate or self.max_rate / 16)
+        self.rate = self.max_rate
+        self.burst = float(burst or max(1, rate))
+        self._tokens = self.burst
+        self._updated = time.monotonic()
+        self._blocked_until = 0
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                if now < self._blocked_until:
+                    wait = self._blocked_until - now
+                else:
+                    self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+                    self._updated = now
+                    if self._tokens >= 1:
+                        self._tokens -= 1
+                        return
+                    wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+
+    def throttle(self, delay):
+        with self._lock:
+            now = time.monotonic()
+            self._blocked_until = max(self._blocked_until, now + delay)
+            self._tokens = 0
+            self._updated = max(now, self._blocked_until)
+            self.rate = max(self.min_rate, self.rate / 2)
+
+    def recover(self):
+        with self._lock:
+            if self.rate < self.max_rate:
+                self.rate = min(self.max_rate, self.rate + self.max_rate / 20)
+
+
+def retry_after(resp, default):
+    """Seconds to wait before retrying, from the Retry-After header of resp if it has a usable one."""
+    value = resp.headers.get('Retry-After') if resp.headers else None
+    if not value:
+        return default
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, email.utils.parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError, IndexError):
+        return default
@@ -0,0 +1,178 @@
+import json
+import logging
+import os
+import socket
+import threading
+import time
+
+from .dedup import RecentEvents, event_id
+from .dispatch import Dispatcher
+from .monitor import Monitor
+
+logger = logging.getLogger(__name__)
+
+# A Unix socket refuses writes when no relay is listening, so pings fall back to being sent directly.
+# UDP gives no such signal: a datagram to a port nobody listens on is silently lost.
+DEFAULT_ADDRESS = 'unix:///tmp/cronitor-relay.sock'
+
+# Largest datagram the relay will read. Events are a few hundred bytes, messages included.
+MAX_EVENT_SIZE = 65507
+
+_sockets = {}
+_sockets_lock = threading.Lock()
+
+
+def parse_address(address):
+    """
+    Parse a relay address into a socket family and socket address. Accepts unix:///path/to.sock,
+    udp://host:port, a bare filesystem path, or a bare host:port.
+    """
+    if address.startswith('unix://'):
+        return socket.AF_UNIX, address[len('unix://'):]
+    if address.startswith('udp://'):
+        address = address[len('udp://'):]
+    elif address.startswith('/') or address.startswith('.'):
+        return socket.AF_UNIX, address
+
+    host, sep, port = address.rpartition(':')
+    if not sep or not port.isdigit():
+        raise ValueError("Invalid relay address '{}'. Use unix:///path/to.sock or udp://host:port".format(address))
+    return socket.AF_INET, (host.strip('[]') or '127.0.0.1', int(port))
+
+
+def send(address, event):
+    """
+    Hand an event off to a relay. This is a single non-blocking datagram write on a socket cached
+    for the life of the process, so it never waits on the network or on a stalled relay. Raises
+    OSError if no relay is listening on a Unix socket address or its queue is full; over UDP the
+    write succeeds regardless. Raises ValueError for events larger than MAX_EVENT_SIZE.
+    """
+    family, sockaddr = parse_address(address)
+    with _sockets_lock:
+        sock = _sockets.get(address)
+        if sock is None:
+            sock = _sockets[address] = socket.socket(family, socket.SOCK_DGRAM)
+            sock.setblocking(False)
+    data = json.dumps(event, separators=(',', ':')).encode('utf-8')
+    if len(data) > MAX_EVENT_SIZE:
+        # the relay would read a truncated datagram, so large events must be sent directly
+        raise ValueError('Event is {} bytes, more than the {} a relay accepts'.format(len(data), MAX_EVENT_SIZE))
+    sock.sendto(data, sockaddr)
+
+
+class RelayServer(object):
+    """
+    Receives events from local processes and sends them to Cronitor over warm pooled connections.
+    Duplicate events are dropped, and events that cannot be delivered are appended to a spool
+    file and replayed every `retry_interval` seconds until they go through.
+    """
+
+    def __init__(self, address=DEFAULT_ADDRESS, workers=4, spool=None, retry_interval=30, dedupe_ttl=300):
+        self.address = address
+        self.spool = spool
+        self.retry_interval = retry_interval
+        self._recent = RecentEvents(ttl=dedupe_ttl)
+        self._monitors = {}
+        self._spool_lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._dispatcher = Dispatcher(workers=workers, on_failure=self._spool_event if spool else None)
+        self._sock = None
+
+    def bind(self):
+        family, sockaddr = parse_address(self.address)
+        if family == socket.AF_UNIX and os.path.exists(sockaddr):
+            os.unlink(sockaddr)
+        self._sock = socket.socket(family, socket.SOCK_DGRAM)
+        self._sock.bind(sockaddr)
+        self._sock.settimeout(0.5)
+        return self._sock
+
+    def serve_forever(self):
+        if self._sock is None:
+            self.bind()
+        logger.info('Cronitor relay listening on %s', self.address)
+        next_replay = time.monotonic()
+        try:
+            while not self._stopped.is_set():
+                if self.spool and time.monotonic() >= next_replay:
+                    self.replay()
+                    next_replay = time.monotonic() + self.retry_interval
+                try:
+                    data = self._sock.recv(MAX_EVENT_SIZE)
+                except socket.timeout:
+                    continue
+                self.handle(data)
+        finally:
+            self._dispatcher.close()
+            self._close_socket()
+
+    def stop(self):
+        self._stopped.set()
+
+    def handle(self, data):
+        try:
+            event = json.loads(data.decode('utf-8'))
+            key = event.pop('key')
+        except (ValueError, KeyError, AttributeError, TypeError):
+            logger.warning('Dropping malformed relay event %r', data[:200])
+            return
+
+        if self._recent.seen(self._event_id(key, event)):
+            logger.debug("Dropping duplicate event for '%s'", key)
+            return
+        self._submit(key, event)
+
+    def replay(self):
+        """Resubmit spooled events. Anything that fails again is spooled again."""
+        if not self.spool:
+            return 0
+        replaying = '{}.replay'.format(self.spool)
+        with self._spool_lock:
+            if not os.path.exists(self.spool):
+                return 0
+            os.replace(self.spool, replaying)
+
+        count = 0
+        with open(replaying, 'r') as spooled:
+            for line in spooled:
+                try:
+                    event = json.loads(line)
+                    key = event.pop('key')
+                except (ValueError, KeyError):
+                    continue
+                self._submit(key, event)
+                count += 1
+        os.unlink(replaying)
+        if count:
+            logger.info('Replayed %s spooled event%s', count, 's' if count != 1 else '')
+        return count
+
+    def _submit(self, key, event):
+        api_key, env = event.pop('api_key', None), event.pop('env', None)
+        monitor = self._monitors.get((api_key, key, env))
+        if monitor is None:
+            # never relay from the relay itself
+            monitor = Monitor(key, api_key=api_key, env=env, relay_address='')
+            self._monitors[(api_key, key, env)] = monitor
+        self._dispatcher.submit(monitor, **event)
+
+    def _spool_event(self, monitor, params):
+        event = dict(params, key=monitor.key, api_key=monitor.api_key, env=monitor.env)
+        with self._spool_lock:
+            with open(self.spool, 'a') as spool:
+                spool.write(json.dumps(event, separators=(',', ':')) + '\n')
+
+    def _close_socket(self):
+        family, sockaddr = parse_address(self.address)
+        self._sock.close()
+        if family == socket.AF_UNIX and os.path.exists(sockaddr):
+            os.unlink(sockaddr)
+
+    @staticmethod
+    def _event_id(key, event):
+        # Events in a series are unique per state. Without a series, only an exact
+        # resend of the same event (same client timestamp) is a duplicate.
+        if event.get('series') is not None:
+            return event_id(key, event.get('state'), event['series'], env=event.get('env'), api_key=event.get('api_key'))
+        return (event.get('api_key'), key, event.get('env'), event.get('state'),
+                event.get('message'), event.get('stamp'))
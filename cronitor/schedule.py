@@ -0,0 +1,454 @@
+import calendar
+import heapq
+import itertools
+import logging
+import re
+import threading
+from collections import namedtuple
+from datetime import datetime, timedelta, timezone
+from functools import lru_cache
+
+try:
+    from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+except ImportError:
+    ZoneInfo = None
+
+logger = logging.getLogger(__name__)
+
+MISSED = 'missed'
+OVERRUN = 'overrun'
+
+# seconds a job may start after its expected time before it is reported as missed
+DEFAULT_GRACE = 60
+
+ALIASES = {
+    '@yearly': '0 0 1 1 *',
+    '@annually': '0 0 1 1 *',
+    '@monthly': '0 0 1 * *',
+    '@weekly': '0 0 * * 0',
+    '@daily': '0 0 * * *',
+    '@midnight': '0 0 * * *',
+    '@hourly': '0 * * * *',
+}
+
+MONTHS = {name: i + 1 for i, name in enumerate(
+    ['jan', 'feb', 'mar', 'apr', 'may', 'jun', 'jul', 'aug', 'sep', 'oct', 'nov', 'dec'])}
+DAYS = {name: i for i, name in enumerate(['sun', 'mon', 'tue', 'wed', 'thu', 'fri', 'sat'])}
+
+# name, lowest value, highest value, value names
+FIELDS = (
+    ('minute', 0, 59, {}),
+    ('hour', 0, 23, {}),
+    ('day of month', 1, 31, {}),
+    ('month', 1, 12, MONTHS),
+    ('day of week', 0, 7, DAYS),
+)
+
+UNITS = {
+    'second': 1, 'seconds': 1, 'sec': 1, 'secs': 1, 's': 1,
+    'minute': 60, 'minutes': 60, 'min': 60, 'mins': 60, 'm': 60,
+    'hour': 3600, 'hours': 3600, 'hr': 3600, 'hrs': 3600, 'h': 3600,
+    'day': 86400, 'days': 86400, 'd': 86400,
+    'week': 604800, 'weeks': 604800, 'w': 604800,
+}
+
+# day-by-day searches give up after this many steps, e.g. for '0 0 30 2 *' which never fires
+MAX_SEARCH_STEPS = 10000
+
+_DURATION_PART = re.compile(r'^(\d+(?:\.\d+)?)?\s*([a-z]+)$')
+_DURATION_ASSERTION = re.compile(r'^metric\.duration\s*<=?\s*(.+)$')
+_CRON_LIKE = re.compile(r'^[\d*?,/-]+$')
+# Quartz extensions (L, W, #) that the API may accept but this engine does not evaluate
+_EXTENSION_TOKEN = re.compile(r'^(\d*[lw]|lw|\d+#\d+)$')
+
+
+class InvalidSchedule(ValueError):
+    pass
+
+
+class _Unsupported(Exception):
+    pass
+
+
+Alert = namedtuple('Alert', 'key reason expected')
+
+
+def parse(text):
+    """
+    Compile a schedule string into a CronSchedule or IntervalSchedule. Compiled schedules are
+    cached, so parsing the same schedule again is a dictionary lookup. Returns None for formats
+    that are valid for the API but cannot be evaluated locally (e.g. '@reboot' or Quartz 'L'/'W'/'#'),
+    and raises InvalidSchedule for malformed cron expressions and intervals.
+    """
+    return _compile(' '.join(text.strip().lower().split()))
+
+
+@lru_cache(maxsize=4096)
+def _compile(text):
+    if text.startswith('every '):
+        seconds = parse_duration(text[len('every '):])
+        if seconds is None:
+            return None
+        if seconds <= 0:
+            raise InvalidSchedule("Interval must be greater than zero in '{}'".format(text))
+        return IntervalSchedule(seconds, text)
+
+    expression = ALIASES.get(text, text)
+    if expression.startswith('@'):
+        return None
+
+    fields = expression.split(' ')
+    if len(fields) != 5:
+        # only reject what is clearly meant to be a cron expression, leave other formats to the API
+        if all(_CRON_LIKE.match(field) for field in fields):
+            raise InvalidSchedule("Expected 5 fields in cron schedule '{}', found {}".format(text, len(fields)))
+        return None
+    try:
+        bits = [_parse_field(field, *spec) for field, spec in zip(fields, FIELDS)]
+    except _Unsupported:
+        return None
+
+    dows = bits[4]
+    if dows & (1 << 7):
+        dows = (dows | 1) & ~(1 << 7)
+    day_any = [field.startswith('*') or field == '?' for field in fields[2:5:2]]
+    return CronSchedule(bits[0], bits[1], bits[2], bits[3], dows, day_any[0] or day_any[1], text)
+
+
+def parse_duration(text):
+    """
+    Parse a humanized duration like '10 minutes', '1 hour, 2 minutes and 3.50 seconds' or 'day'
+    into seconds. Returns None if it uses a unit without a fixed length, such as months.
+    """
+    total = 0.0
+    for part in re.split(r',|\band\b', text.lower()):
+        part = part.strip()
+        if not part:
+            continue
+        match = _DURATION_PART.match(part)
+        if not match:
+            raise InvalidSchedule("Could not parse duration '{}'".format(text))
+        amount, unit = match.groups()
+        if unit not in UNITS:
+            return None
+        total += float(amount or 1) * UNITS[unit]
+    return total
+
+
+def max_duration(assertions):
+    """The duration limit in seconds from a 'metric.duration < N unit' assertion, if there is one."""
+    for assertion in assertions or []:
+        match = _DURATION_ASSERTION.match(str(assertion).strip().lower())
+        if match:
+            try:
+                return parse_duration(match.group(1))
+            except InvalidSchedule:
+                return None
+    return None
+
+
+def get_timezone(name):
+    """The tzinfo for an IANA timezone name such as 'America/New_York', as used by a monitor's `timezone` attribute."""
+    if not name or name.upper() == 'UTC':
+        return timezone.utc
+    if ZoneInfo is None:
+        raise InvalidSchedule("Timezone '{}' requires Python 3.9 or later".format(name))
+    try:
+        return ZoneInfo(name)
+    except (ZoneInfoNotFoundError, ValueError):
+        raise InvalidSchedule("Unknown timezone '{}'".format(name))
+
+
+def _parse_field(text, name, low, high, names):
+    bits = 0
+    for part in text.split(','):
+        step = None
+        if '/' in part:
+            part, step_text = part.split('/', 1)
+            if not step_text.isdigit() or int(step_text) < 1:
+                raise InvalidSchedule("Invalid step '{}' in {} field '{}'".format(step_text, name, text))
+            step = int(step_text)
+
+        if part in ('*', '?'):
+            start, end = low, high
+        elif '-' in part:
+            start, end = (_field_value(v, name, names, text) for v in part.split('-', 1))
+        else:
+            start = _field_value(part, name, names, text)
+            end = high if step else start
+
+        if start < low or end > high or start > end:
+            raise InvalidSchedule("Value out of range in {} field '{}'".format(name, text))
+        for value in range(start, end + 1, step or 1):
+            bits |= 1 << value
+    return bits
+
+
+def _field_value(token, name, names, text):
+    if token.isdigit():
+        return int(token)
+    if token in names:
+        return names[token]
+    if _EXTENSION_TOKEN.match(token):
+        raise _Unsupported(token)
+    raise InvalidSchedule("Invalid value '{}' in {} field '{}'".format(token, name, text))
+
+
+def _next_bit(bits, start):
+    """The lowest set bit at or above start, or None."""
+    remaining = bits >> start
+    if not remaining:
+        return None
+    return start + (remaining & -remaining).bit_length() - 1
+
+
+def _prev_bit(bits, start):
+    """The highest set bit at or below start, or None."""
+    if start < 0:
+        return None
+    remaining = bits & ((1 << (start + 1)) - 1)
+    return remaining.bit_length() - 1 if remaining else None
+
+
+class CronSchedule(object):
+    """
+    A compiled cron expression. Each field is stored as a bitset, so finding the next matching
+    minute or hour is a couple of integer operations rather than a scan.
+    """
+
+    def __init__(self, minutes, hours, doms, months, dows, day_any, text=None):
+        self.minutes = minutes
+        self.hours = hours
+        self.doms = doms
+        self.months = months
+        self.dows = dows
+        # as in cron, a restricted day of month and day of week match when either does
+        self.day_any = day_any
+        self.text = text
+
+    def matches(self, dt):
+        return bool(self.months >> dt.month & 1 and self._day_matches(dt)
+                    and self.hours >> dt.hour & 1 and self.minutes >> dt.minute & 1)
+
+    def next(self, after):
+        """The first time this schedule fires strictly after `after`, or None if it never does."""
+        t = after.replace(second=0, microsecond=0) + timedelta(minutes=1)
+        for _ in range(MAX_SEARCH_STEPS):
+            if not self.months >> t.month & 1:
+                month = _next_bit(self.months, t.month + 1)
+                year = t.year
+                if month is None:
+                    year, month = year + 1, _next_bit(self.months, 1)
+                t = t.replace(year=year, month=month, day=1, hour=0, minute=0)
+                continue
+            if not self._day_matches(t):
+                t = t.replace(hour=0, minute=0) + timedelta(days=1)
+                continue
+            hour = _next_bit(self.hours, t.hour)
+            if hour is None:
+                t = t.replace(hour=0, minute=0) + timedelta(days=1)
+                continue
+            if hour != t.hour:
+                t = t.replace(hour=hour, minute=0)
+            minute = _next_bit(self.minutes, t.minute)
+            if minute is None:
+                t = t.replace(minute=0) + timedelta(hours=1)
+                continue
+            return t.replace(minute=minute)
+        return None
+
+    def prev(self, before):
+        """The last time this schedule fired at or before `before`, or None if it never did."""
+        t = before.replace(second=0, microsecond=0)
+        for _ in range(MAX_SEARCH_STEPS):
+            if not self.months >> t.month & 1:
+                month = _prev_bit(self.months, t.month - 1)
+                year = t.year
+                if month is None:
+                    year, month = year - 1, _prev_bit(self.months, 12)
+                last_day = calendar.monthrange(year, month)[1]
+                t = t.replace(year=year, month=month, day=last_day, hour=23, minute=59)
+                continue
+            if not self._day_matches(t):
+                t = t.replace(hour=0, minute=0) - timedelta(minutes=1)
+                continue
+            hour = _prev_bit(self.hours, t.hour)
+            if hour is None:
+                t = t.replace(hour=0, minute=0) - timedelta(minutes=1)
+                continue
+            if hour != t.hour:
+                t = t.replace(hour=hour, minute=59)
+            minute = _prev_bit(self.minutes, t.minute)
+            if minute is None:
+                t = t.replace(minute=0) - timedelta(minutes=1)
+                continue
+            return t.replace(minute=minute)
+        return None
+
+    def _day_matches(self, dt):
+        dom = self.doms >> dt.day & 1
+        dow = self.dows >> (dt.weekday() + 1) % 7 & 1
+        if self.day_any:
+            return bool(dom and dow)
+        return bool(dom or dow)
+
+    def __repr__(self):
+        return 'CronSchedule({!r})'.format(self.text)
+
+
+class IntervalSchedule(object):
+    """A schedule like 'every 10 minutes', which fires a fixed interval after the previous run."""
+
+    def __init__(self, seconds, text=None):
+        self.interval = timedelta(seconds=seconds)
+        self.text = text
+
+    def next(self, after):
+        return after + self.interval
+
+    def prev(self, before):
+        return before - self.interval
+
+    def __repr__(self):
+        return 'IntervalSchedule({!r})'.format(self.text)
+
+
+class _Job(object):
+    __slots__ = ('key', 'schedule', 'tz', 'grace', 'max_duration', 'expected', 'started', 'missed_gen', 'overrun_gen')
+
+    def __init__(self, key, schedule, tz, grace, max_duration):
+        self.key = key
+        self.schedule = schedule
+        self.tz = tz
+        self.grace = timedelta(seconds=grace)
+        self.max_duration = timedelta(seconds=max_duration) if max_duration else None
+        self.expected = None
+        self.started = None
+        self.missed_gen = 0
+        self.overrun_gen = 0
+
+    def next(self, after):
+        # cron fields are wall-clock times in the job's own timezone
+        return self.schedule.next(after.astimezone(self.tz))
+
+
+class Watchdog(object):
+    """
+    Detects locally, without asking the API, when a tracked job misses its expected start time
+    or runs longer than its duration limit. Every pending deadline sits in one heap, so `check()`
+    only touches jobs whose deadline has passed and costs the same with ten or ten thousand jobs.
+
+    Hooks added with `add_hook(callback)` are called with an Alert(key, reason, expected) where
+    reason is MISSED or OVERRUN. Adding a hook starts a background thread that checks every
+    `tick` seconds; `check()` can also be called directly. Each job's schedule is evaluated in the
+    timezone it was tracked with, or `tz` (UTC, Cronitor's default) if none was given.
+    """
+
+    def __init__(self, tz=timezone.utc, tick=1.0):
+        self.tz = tz
+        self.tick = tick
+        self._jobs = {}
+        self._heap = []
+        self._hooks = []
+        self._seq = itertools.count()
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._thread = None
+
+    def track(self, key, schedule, grace=DEFAULT_GRACE, max_duration=None, tz=None, now=None):
+        """Watch job `key`. Returns False if the schedule cannot be evaluated locally."""
+        if isinstance(schedule, str):
+            schedule = parse(schedule)
+        if schedule is None:
+            return False
+        if isinstance(tz, str):
+            tz = get_timezone(tz)
+
+        now = now or self._now()
+        with self._lock:
+            job = self._jobs[key] = _Job(key, schedule, tz or self.tz, grace, max_duration)
+            self._expect(job, job.next(now))
+        return True
+
+    def untrack(self, key):
+        with self._lock:
+            self._jobs.pop(key, None)
+
+    def run_started(self, key, at=None):
+        job = self._jobs.get(key)
+        if job is None:
+            return
+        at = at or self._now()
+        with self._lock:
+            # a run that starts within the grace period of the expected time fills that window
+            reference = at
+            if job.expected is not None and at >= job.expected - job.grace:
+                reference = max(at, job.expected)
+            self._expect(job, job.next(reference))
+
+            if job.max_duration:
+                job.started = at
+                job.overrun_gen += 1
+                self._push(at + job.max_duration, job.overrun_gen, key, OVERRUN)
+
+    def run_finished(self, key, at=None):
+        job = self._jobs.get(key)
+        if job is None:
+            return
+        with self._lock:
+            job.started = None
+            job.overrun_gen += 1
+
+    def check(self, now=None):
+        """Return alerts for every deadline that has passed, calling hooks for each."""
+        now = now or self._now()
+        alerts = []
+        with self._lock:
+            while self._heap and self._heap[0][0] <= now:
+                _, _, generation, key, reason = heapq.heappop(self._heap)
+                job = self._jobs.get(key)
+                if job is None:
+                    continue
+                if reason == MISSED and generation == job.missed_gen:
+                    alerts.append(Alert(key, MISSED, job.expected))
+                    # watch the next window, skipping any that have already gone by
+                    self._expect(job, job.next(max(job.expected, now - job.grace)))
+                elif reason == OVERRUN and generation == job.overrun_gen:
+                    alerts.append(Alert(key, OVERRUN, job.started + job.max_duration))
+
+        for alert in alerts:
+            for hook in list(self._hooks):
+                try:
+                    hook(alert)
+                except Exception:
+                    logger.exception('Watchdog hook failed for %s', alert)
+        return alerts
+
+    def add_hook(self, callback):
+        self._hooks.append(callback)
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, daemon=True)
+                self._thread.start()
+
+    def stop(self):
+        self._stopped.set()
+
+    def __len__(self):
+        return len(self._jobs)
+
+    def _expect(self, job, expected):
+        job.expected = expected
+        job.missed_gen += 1
+        if expected is not None:
+            self._push(expected + job.grace, job.missed_gen, job.key, MISSED)
+
+    def _push(self, deadline, generation, key, reason):
+        heapq.heappush(self._heap, (deadline, next(self._seq), generation, key, reason))
+
+    def _now(self):
+        return datetime.now(self.tz)
+
+    def _run(self):
+        while not self._stopped.wait(self.tick):
+            self.check()
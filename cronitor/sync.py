@@ -0,0 +1,127 @@
+import atexit
+import hashlib
+import json
+import logging
+import threading
+import time
+from collections import OrderedDict
+
+import requests
+
+import cronitor
+
+logger = logging.getLogger(__name__)
+
+# largest number of monitors sent in one Monitor.put call
+MAX_BATCH_SIZE = 100
+# longest wait, in seconds, before retrying a batch that failed to sync
+MAX_BACKOFF = 300
+
+
+class MonitorSync(object):
+    """
+    Collects monitor attributes registered with cronitor.job and syncs them with Monitor.put from a
+    background thread. Registrations are debounced: a batch is sent once nothing new has been
+    registered for `debounce` seconds, so a burst of decorated jobs becomes a few requests. Monitors
+    whose attributes are unchanged since they were last synced are skipped. A batch that fails is
+    queued again and retried with exponential backoff.
+    """
+
+    def __init__(self, monitor_class, debounce=1.0):
+        self.monitor_class = monitor_class
+        self.debounce = debounce
+        self._pending = OrderedDict()
+        self._synced = {}
+        self._deadline = 0
+        self._backoff = 0
+        self._cond = threading.Condition()
+        # held for the whole of a flush, so the flush at exit waits for one already in progress
+        self._flush_lock = threading.Lock()
+        self._thread = None
+
+    def register(self, attributes):
+        """Queue attributes (which must include a key) to be synced. Returns False if they are already synced."""
+        key = attributes['key']
+        digest = _digest(attributes)
+        with self._cond:
+            if self._synced.get(key) == digest:
+                return False
+            if key in self._pending and self._pending[key][1] == digest:
+                return True
+            self._pending[key] = (dict(attributes), digest)
+            self._deadline = time.monotonic() + self.debounce
+            self._start()
+            self._cond.notify()
+        return True
+
+    def flush(self):
+        """Sync everything pending now. Returns the number of monitors synced."""
+        with self._flush_lock:
+            with self._cond:
+                batch, self._pending = self._pending, OrderedDict()
+            items = list(batch.items())
+
+            synced = 0
+            failed = []
+            for i in range(0, len(items), MAX_BATCH_SIZE):
+                chunk = items[i:i + MAX_BATCH_SIZE]
+                try:
+                    self.monitor_class.put([attributes for _, (attributes, _) in chunk])
+                except (cronitor.APIError, cronitor.APIValidationError, cronitor.AuthenticationError,
+                        requests.exceptions.RequestException) as e:
+                    logger.error('Could not sync monitors %s: %s', [key for key, _ in chunk], e)
+                    failed.extend(chunk)
+                    continue
+                except Exception:
+                    # e.g. an unreadable response; the batch is retried like any other failure
+                    logger.exception('Unexpected error syncing monitors %s', [key for key, _ in chunk])
+                    failed.extend(chunk)
+                    continue
+
+                with self._cond:
+                    for key, (_, digest) in chunk:
+                        self._synced[key] = digest
+                synced += len(chunk)
+
+            with self._cond:
+                if failed:
+                    self._requeue(failed)
+                elif items:
+                    self._backoff = 0
+            return synced
+
+    def _requeue(self, items):
+        # attributes registered again while the batch was in flight take precedence
+        for key, value in items:
+            if key not in self._pending:
+                self._pending[key] = value
+        self._backoff = min(MAX_BACKOFF, (self._backoff * 2) or self.debounce)
+        self._deadline = time.monotonic() + self._backoff
+        logger.info('Retrying sync of %s monitor%s in %.0fs', len(items), 's' if len(items) != 1 else '', self._backoff)
+        self._cond.notify()
+
+    def _start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, daemon=True)
+            self._thread.start()
+            atexit.register(self.flush)
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._pending:
+                    self._cond.wait()
+                wait = self._deadline - time.monotonic()
+                if wait > 0:
+                    self._cond.wait(wait)
+                    continue
+            try:
+                self.flush()
+            except Exception:
+                # the thread is never restarted, so it must outlive any error
+                logger.exception('Unexpected error in monitor sync')
+
+
+def _digest(attributes):
+    encoded = json.dumps(attributes, sort_keys=True, default=str).encode('utf-8')
+    return hashlib.sha1(encoded).hexdigest()
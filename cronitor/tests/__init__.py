@@ -0,0 +1,11 @@
+import time
+
+
+def wait_for(condition, timeout=5):
+    """Poll condition() until it is true, for tests of background threads. Returns False on timeout."""
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if condition():
+            return True
+        time.sleep(0.01)
+    return False
@@ -0,0 +1,106 @@
+import io
+import sys
+import unittest
+from unittest.mock import patch, call, ANY, MagicMock
+
+import requests
+
+import cronitor
+import cronitor.dispatch
+from cronitor import __main__ as cli
+
+FAKE_KEY = 'd3x0c1'
+FAKE_API_KEY = 'ping-api-key'
+
+
+class ParseEventTests(unittest.TestCase):
+
+    def test_parse_json_event(self):
+        event = cli.parse_event('{"key": "a", "state": "complete", "metrics": {"count": 2}, "extra": 1}\n')
+        self.assertEqual(event, {'key': 'a', 'state': 'complete', 'metrics': {'count': 2}})
+
+    def test_parse_text_event(self):
+        self.assertEqual(cli.parse_event('a fail disk is full\n'), {'key': 'a', 'state': 'fail', 'message': 'disk is full'})
+        self.assertEqual(cli.parse_event('a'), {'key': 'a'})
+
+    def test_parse_ignores_blank_and_comments(self):
+        self.assertIsNone(cli.parse_event('\n'))
+        self.assertIsNone(cli.parse_event('# comment'))
+
+    def test_parse_invalid_json(self):
+        with self.assertRaises(ValueError):
+            cli.parse_event('{"state": "run"}')
+        with self.assertRaises(ValueError):
+            cli.parse_event('{not json')
+
+
+class CommandTests(unittest.TestCase):
+
+    def setUp(self):
+        cronitor.api_key = FAKE_API_KEY
+
+    @patch('cronitor.Monitor.ping')
+    def test_ping_command(self, mocked_ping):
+        self.assertEqual(cli.main(['--key', FAKE_KEY, '--run', '-m', 'hello']), 0)
+        mocked_ping.assert_called_once_with(state='run', message='hello')
+
+    @patch('cronitor.Monitor.ping')
+    def test_ping_command_tick(self, mocked_ping):
+        cli.main(['-i', FAKE_KEY, '--tick'])
+        mocked_ping.assert_called_once_with(message='')
+
+    @patch('cronitor.Monitor.ping')
+    def test_stream_events(self, mocked_ping):
+        lines = io.StringIO('job-a run\n\n{"key": "job-b", "state": "complete", "metrics": {"count": 3}}\n{bad json\n')
+        with patch('sys.stderr', new=io.StringIO()):
+            with cronitor.Client(workers=2) as client:
+                invalid = cli.stream_events(lines, client)
+                dispatcher = client.dispatcher
+
+        self.assertEqual(invalid, 1)
+        self.assertEqual(dispatcher.sent, 2)
+        mocked_ping.assert_has_calls([call(state='run'), call(state='complete', metrics={'count': 3})], any_order=True)
+
+    def test_stream_duplicate_series_events(self):
+        lines = io.StringIO('{"key": "a", "state": "run", "series": "1"}\n' * 2 +
+                            '{"key": "a", "state": "run", "series": "1", "env": "staging"}\n')
+        with cronitor.Client(workers=1) as client:
+            with patch.object(client.session, 'get') as mocked_get:
+                cli.stream_events(lines, client)
+                dispatcher = client.dispatcher
+                dispatcher.join()
+
+        # the duplicate is skipped, the same run in another environment is not
+        self.assertEqual(mocked_get.call_count, 2)
+        self.assertEqual(dispatcher.sent, 3)
+
+    def test_dispatcher_survives_unexpected_errors(self):
+        monitor = MagicMock()
+        monitor.ping.side_effect = [TypeError('boom'), MagicMock(ok=True)]
+        with patch('cronitor.dispatch.logger'):
+            with cronitor.dispatch.Dispatcher(workers=1) as dispatcher:
+                dispatcher.submit(monitor, state='run')
+                dispatcher.submit(monitor, state='complete')
+        self.assertEqual((dispatcher.sent, dispatcher.failed), (1, 1))
+
+    @patch('cronitor.Monitor.ping')
+    def test_exec_command_success(self, mocked_ping):
+        exit_code = cli.main(['exec', FAKE_KEY, '--', sys.executable, '-c', 'pass'])
+        self.assertEqual(exit_code, 0)
+        mocked_ping.assert_has_calls([
+            call(state='run', series=ANY),
+            call(state='complete', message='Exited with code 0', metrics={'duration': ANY}, series=ANY)])
+
+    @patch('cronitor.Monitor.ping')
+    def test_exec_command_failure(self, mocked_ping):
+        exit_code = cli.main(['exec', FAKE_KEY, sys.executable, '-c', 'raise SystemExit(3)'])
+        self.assertEqual(exit_code, 3)
+        mocked_ping.assert_called_with(state='fail', message='Exited with code 3', metrics={'duration': ANY}, series=ANY)
+
+    @patch('cronitor.Monitor.ping', side_effect=requests.exceptions.ConnectionError('unreachable'))
+    def test_exec_command_runs_when_cronitor_is_unreachable(self, mocked_ping):
+        with patch('sys.stderr', new=io.StringIO()) as stderr:
+            exit_code = cli.main(['exec', FAKE_KEY, sys.executable, '-c', 'raise SystemExit(4)'])
+        self.assertEqual(exit_code, 4)
+        self.assertEqual(mocked_ping.call_count, 2)
+        self.assertIn('unreachable', stderr.getvalue())
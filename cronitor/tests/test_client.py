@@ -0,0 +1,63 @@
+import unittest
+from unittest.mock import patch, ANY
+
+import cronitor
+
+FAKE_KEY = 'd3x0c1'
+FAKE_API_KEY = 'ping-api-key'
+
+
+class ClientTests(unittest.TestCase):
+
+    def setUp(self):
+        cronitor.api_key = FAKE_API_KEY
+
+    def test_default_client_is_bound_to_monitor(self):
+        self.assertIs(cronitor.Monitor._client, cronitor.default_client)
+        self.assertIs(cronitor.default_client.Monitor, cronitor.Monitor)
+        self.assertEqual(cronitor.default_client.api_key, FAKE_API_KEY)
+
+    def test_client_settings_fall_back_to_module_configuration(self):
+        client = cronitor.Client(environment='staging')
+        monitor = client.Monitor(FAKE_KEY)
+        self.assertEqual(monitor.api_key, FAKE_API_KEY)
+        self.assertEqual(monitor.env, 'staging')
+        self.assertIsNone(cronitor.Monitor(FAKE_KEY).env)
+
+    def test_clients_do_not_share_state(self):
+        tenant_a = cronitor.Client(api_key='tenant-a')
+        tenant_b = cronitor.Client(api_key='tenant-b')
+        self.assertIsNot(tenant_a.Monitor, tenant_b.Monitor)
+        self.assertIsNot(tenant_a.Monitor._req, tenant_b.Monitor._req)
+        self.assertIsNot(tenant_a.Monitor._req, cronitor.Monitor._req)
+        self.assertIsNot(tenant_a.Monitor._recent, tenant_b.Monitor._recent)
+        self.assertIsNot(tenant_a.Monitor._limiter, tenant_b.Monitor._limiter)
+        self.assertIsInstance(tenant_a.Monitor(FAKE_KEY), cronitor.Monitor)
+
+    def test_client_monitor_pings_through_client_session(self):
+        client = cronitor.Client(api_key='tenant-a')
+        with patch.object(client.session, 'get') as ping, patch('cronitor.Monitor._req.get') as default_ping:
+            client.Monitor(FAKE_KEY).ping(state='run')
+            ping.assert_called_once_with(url='https://cronitor.link/p/tenant-a/{}'.format(FAKE_KEY),
+                                         params=ANY, timeout=5, headers=ANY)
+            default_ping.assert_not_called()
+
+    def test_client_monitor_api_requests_use_client_key(self):
+        client = cronitor.Client(api_key='tenant-a', timeout=3)
+        with patch.object(client.session, 'delete') as delete:
+            delete.return_value.status_code = 204
+            client.Monitor(FAKE_KEY).delete()
+            delete.assert_called_once_with('https://cronitor.io/api/monitors/{}'.format(FAKE_KEY),
+                                           auth=('tenant-a', ''), timeout=3, headers=ANY)
+
+    @patch('cronitor.Monitor.ping')
+    def test_job_decorator_with_client(self, mocked_ping):
+        client = cronitor.Client(api_key='tenant-a')
+
+        @cronitor.job(FAKE_KEY, client=client)
+        def task():
+            return
+
+        with patch.object(client, 'Monitor', wraps=client.Monitor) as monitor_class:
+            task()
+            monitor_class.assert_called_once_with(FAKE_KEY, env=None)
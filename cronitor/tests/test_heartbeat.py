@@ -0,0 +1,129 @@
+import threading
+import time
+import unittest
+from unittest.mock import patch, MagicMock, ANY
+
+import cronitor
+from cronitor.tests import wait_for
+from cronitor.dispatch import Dispatcher
+from cronitor.heartbeat import HeartbeatScheduler
+
+
+class HeartbeatSchedulerTests(unittest.TestCase):
+
+    def setUp(self):
+        self.send = MagicMock()
+        self.scheduler = HeartbeatScheduler(self.send)
+
+    def test_heartbeats_are_sent_until_stopped(self):
+        monitor = MagicMock()
+        beat = self.scheduler.start(monitor, 0.05, series='abc')
+        self.assertTrue(wait_for(lambda: self.send.call_count >= 2))
+        self.send.assert_called_with(beat, {'series': 'abc', 'message': ANY})
+
+        beat.stop()
+        sent = self.send.call_count
+        time.sleep(0.2)
+        self.assertLessEqual(self.send.call_count, sent + 1)
+        self.assertEqual(len(self.scheduler), 0)
+
+    def test_due_beats_are_rescheduled(self):
+        monitor = MagicMock()
+        beat = self.scheduler.start(monitor, 3600)
+        self.assertEqual(self.scheduler.due(beat.started + 3599), [])
+        self.assertEqual(self.scheduler.due(beat.started + 3600),
+                         [(beat, {'message': 'Still running after 3600 seconds'})])
+        # a long stall sends one beat, not one for every missed interval
+        self.assertEqual(len(self.scheduler.due(beat.started + 36000)), 1)
+        self.assertEqual(self.scheduler.due(beat.started + 36001), [])
+        beat.stop()
+
+    def test_many_jobs_share_one_thread(self):
+        beats = [self.scheduler.start(MagicMock(), 3600) for _ in range(5000)]
+        self.assertEqual(len(self.scheduler), 5000)
+        self.assertEqual(len(self.scheduler.due(beats[-1].started + 3600)), 5000)
+
+        for beat in beats[:4000]:
+            beat.stop()
+        self.assertEqual(len(self.scheduler), 1000)
+        # cancelled entries are compacted away instead of waiting to come due
+        self.assertLessEqual(len(self.scheduler._heap), 2 * 1000)
+        self.assertEqual(len(self.scheduler.due(beats[-1].started + 7201)), 1000)
+
+    def test_beat_stopped_while_queued_is_not_sent(self):
+        released = threading.Event()
+        blocker = MagicMock()
+        blocker.ping.side_effect = lambda **params: released.wait(5)
+        monitor = MagicMock()
+        beat = self.scheduler.start(monitor, 3600)
+
+        with Dispatcher(workers=1) as dispatcher:
+            dispatcher.submit(blocker, state='run')
+            dispatcher.submit_heartbeat(beat, message='still running')
+            beat.stop()
+            released.set()
+        monitor.heartbeat.assert_not_called()
+
+    def test_stop_waits_for_beat_being_sent(self):
+        sent = []
+        monitor = MagicMock()
+        monitor.heartbeat.side_effect = lambda **params: time.sleep(0.2) or sent.append(params)
+        beat = self.scheduler.start(monitor, 3600)
+
+        with Dispatcher(workers=1) as dispatcher:
+            dispatcher.submit_heartbeat(beat, message='still running')
+            self.assertTrue(wait_for(lambda: monitor.heartbeat.called))
+            beat.stop()
+            self.assertEqual(len(sent), 1)
+
+    def test_invalid_interval(self):
+        with self.assertRaises(ValueError):
+            self.scheduler.start(MagicMock(), 0)
+
+
+class JobHeartbeatTests(unittest.TestCase):
+
+    def test_job_heartbeat_starts_and_stops(self):
+        client = cronitor.Client(api_key='tenant-a')
+
+        @cronitor.job('long-job', client=client, heartbeat=30)
+        def task():
+            self.assertEqual(len(client.heartbeats), 1)
+
+        with patch.object(client.Monitor, 'ping'):
+            task()
+        self.assertEqual(len(client.heartbeats), 0)
+
+    def test_job_heartbeat_stops_on_failure(self):
+        client = cronitor.Client(api_key='tenant-a')
+
+        @cronitor.job('failing-job', client=client, heartbeat=30)
+        def task():
+            raise ValueError('boom')
+
+        with patch.object(client.Monitor, 'ping'):
+            with self.assertRaises(ValueError):
+                task()
+        self.assertEqual(len(client.heartbeats), 0)
+
+    def test_job_heartbeat_stops_on_interrupt(self):
+        client = cronitor.Client(api_key='tenant-a')
+
+        @cronitor.job('interrupted-job', client=client, heartbeat=30)
+        def task():
+            raise KeyboardInterrupt
+
+        with patch.object(client.Monitor, 'ping'), patch.object(client.watchdog, 'run_finished') as finished:
+            with self.assertRaises(KeyboardInterrupt):
+                task()
+        self.assertEqual(len(client.heartbeats), 0)
+        finished.assert_called_once_with('interrupted-job')
+
+    def test_heartbeat_is_not_deduplicated(self):
+        monitor = cronitor.Monitor('long-job', api_key='apiKey123')
+        with patch('cronitor.Monitor._req') as req:
+            monitor.ping(state='run', series='abc')
+            monitor.heartbeat(series='abc')
+            monitor.heartbeat(series='abc')
+        self.assertEqual(req.get.call_count, 3)
+        self.assertEqual(req.get.call_args[1]['params']['state'], 'run')
@@ -1,7 +1,14 @@
 import copy
+import gzip
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, HTTPServer
+import yaml
 import cronitor
 import unittest
-from unittest.mock import call, patch, ANY
+from cronitor.ratelimit import TokenBucket
+from unittest.mock import call, patch, ANY, MagicMock
 
 import cronitor
 
@@ -49,7 +56,7 @@ class MonitorTests(unittest.TestCase):
         with self.assertRaises(cronitor.APIValidationError):
              cronitor.Monitor.put(**MONITOR)
 
-    @patch('requests.get')
+    @patch('cronitor.Monitor._req.get')
     def test_get_monitor_invalid_code(self, mocked_get):
         mocked_get.return_value.status_code = 404
         with self.assertRaises(cronitor.MonitorNotFound):
@@ -77,9 +84,206 @@ class MonitorTests(unittest.TestCase):
         self.assertIn(MONITOR['key'], monitors['jobs'])
         self.assertIn(MONITOR_2['key'], monitors['jobs'])
 
-    @patch('requests.delete')
+    @patch('cronitor.Monitor._req.delete')
     def test_delete_no_id(self, mocked_delete):
         mocked_delete.return_value.status_code = 204
         monitor = cronitor.Monitor(MONITOR['key'])
         monitor.delete()
 
+    @patch('cronitor.Monitor._req.get')
+    def test_get_many_monitors(self, mocked_get):
+        def get(url, **kwargs):
+            key = url.rsplit('/', 1)[1]
+            resp = MagicMock(status_code=404 if key == 'missing' else 200)
+            resp.json.return_value = dict(MONITOR, key=key)
+            return resp
+        mocked_get.side_effect = get
+
+        monitors = cronitor.Monitor.get_many([MONITOR['key'], 'missing', MONITOR_2['key']], skip_missing=True)
+        self.assertEqual([m.data.key for m in monitors], [MONITOR['key'], MONITOR_2['key']])
+
+        with self.assertRaises(cronitor.MonitorNotFound):
+            list(cronitor.Monitor.get_many(['missing']))
+
+    @patch('cronitor.Monitor._req.get')
+    def test_list_monitors_fetches_all_pages(self, mocked_get):
+        def get(url, params=None, **kwargs):
+            page = params['page']
+            resp = MagicMock(status_code=200)
+            resp.json.return_value = {
+                'monitors': [dict(MONITOR, key='{}-{}'.format(page, i)) for i in range(2 if page < 3 else 1)],
+                'page_size': 2,
+                'total_monitor_count': 5,
+            }
+            return resp
+        mocked_get.side_effect = get
+
+        monitors = cronitor.Monitor.list(type='job', tag=['prod', 'db'])
+        self.assertEqual([m.data.key for m in monitors], ['1-0', '1-1', '2-0', '2-1', '3-0'])
+        self.assertEqual(mocked_get.call_count, 3)
+        mocked_get.assert_any_call('https://cronitor.io/api/monitors', params={'type': 'job', 'tag': ['prod', 'db'], 'page': 1},
+                                   timeout=ANY, auth=ANY, headers=ANY)
+
+    @patch('cronitor.Monitor._req.get')
+    def test_pause_many(self, mocked_get):
+        mocked_get.side_effect = lambda url, **kwargs: MagicMock(status_code=404 if '/missing/' in url else 200)
+
+        results = cronitor.Monitor.pause_many([MONITOR['key'], 'missing'], hours=5, rate_limit=None)
+        self.assertIs(results[MONITOR['key']], True)
+        self.assertIsInstance(results['missing'], cronitor.MonitorNotFound)
+        mocked_get.assert_any_call('https://cronitor.io/api/monitors/{}/pause/5'.format(MONITOR['key']),
+                                   auth=ANY, timeout=ANY, headers=ANY)
+
+    @patch('cronitor.Monitor._req.get')
+    def test_unpause_many_with_rate_limit(self, mocked_get):
+        mocked_get.return_value = MagicMock(status_code=200)
+        keys = ['monitor-{}'.format(i) for i in range(4)]
+        results = cronitor.Monitor.unpause_many(keys, rate_limit=50)
+        self.assertEqual(results, {key: True for key in keys})
+        self.assertEqual(mocked_get.call_count, 4)
+
+    @patch('cronitor.Monitor._req.delete')
+    @patch('cronitor.Monitor.list')
+    def test_delete_many_by_tag(self, mocked_list, mocked_delete):
+        mocked_list.return_value = [cronitor.Monitor(MONITOR['key']), cronitor.Monitor(MONITOR_2['key'])]
+        mocked_delete.return_value.status_code = 204
+
+        results = cronitor.Monitor.delete_many(tag='old')
+        self.assertEqual(results, {MONITOR['key']: True, MONITOR_2['key']: True})
+        mocked_list.assert_called_once_with(type=None, group=None, env=None, tag='old', api_key=ANY)
+
+    def test_bulk_requires_selection(self):
+        with self.assertRaises(ValueError):
+            cronitor.Monitor.unpause_many()
+
+    @patch('cronitor.Monitor._limiter', new_callable=lambda: TokenBucket(100))
+    @patch('cronitor.Monitor._req.get')
+    def test_throttled_request_is_retried_after_delay(self, mocked_get, limiter):
+        throttled = MagicMock(status_code=429, headers={'Retry-After': '0.2'})
+        ok = MagicMock(status_code=200)
+        ok.json.return_value = MONITOR
+        mocked_get.side_effect = [throttled, ok]
+
+        start = time.monotonic()
+        monitor = cronitor.Monitor(MONITOR['key'])
+        self.assertEqual(monitor.data.key, MONITOR['key'])
+        self.assertGreaterEqual(time.monotonic() - start, 0.2)
+        self.assertEqual(mocked_get.call_count, 2)
+        self.assertLess(limiter.rate, 100)
+        throttled.close.assert_called_once_with()
+
+    @patch('cronitor.Monitor._limiter', new_callable=lambda: TokenBucket(100))
+    @patch('cronitor.Monitor._req.delete')
+    def test_rate_limit_error_when_throttling_persists(self, mocked_delete, limiter):
+        mocked_delete.return_value = MagicMock(status_code=429, headers={'Retry-After': '0'})
+        with self.assertRaises(cronitor.RateLimitError):
+            cronitor.Monitor(MONITOR['key']).delete()
+        self.assertEqual(mocked_delete.call_count, cronitor.monitor.API_ATTEMPTS)
+
+    @patch('cronitor.Monitor._req.put')
+    def test_put_sends_compressed_body(self, mocked_put):
+        mocked_put.return_value.status_code = 200
+        mocked_put.return_value.content = json.dumps({'monitors': [MONITOR]}).encode()
+
+        with patch('cronitor.compress_requests', True):
+            monitor = cronitor.Monitor.put(**MONITOR)
+
+        self.assertEqual(monitor.data.key, MONITOR['key'])
+        kwargs = mocked_put.call_args[1]
+        self.assertEqual(kwargs['headers']['Content-Encoding'], 'gzip')
+        # a small body is sent in one piece, with a Content-Length
+        self.assertIsInstance(kwargs['data'], bytes)
+        self.assertEqual(json.loads(gzip.decompress(kwargs['data'])), {'monitors': [MONITOR]})
+
+    @patch('cronitor.monitor.STREAM_THRESHOLD', 1024)
+    @patch('cronitor.Monitor._stream_req.put')
+    def test_put_streams_large_body(self, mocked_put):
+        monitors = [dict(MONITOR, key='monitor-{}'.format(i)) for i in range(100)]
+        mocked_put.return_value.status_code = 200
+        mocked_put.return_value.content = json.dumps({'monitors': monitors}).encode()
+
+        self.assertEqual(len(cronitor.Monitor.put(monitors)), 100)
+        body = mocked_put.call_args[1]['data']
+        self.assertNotIsInstance(body, bytes)
+        self.assertEqual(json.loads(b''.join(body)), {'monitors': monitors})
+
+    def test_encode_body(self):
+        payload = {'monitors': [dict(MONITOR, key='monitor-{}'.format(i)) for i in range(5000)]}
+        for encoder in (None, cronitor.monitor.orjson):
+            with patch('cronitor.monitor.orjson', encoder):
+                chunks = list(cronitor.monitor._encode_body(payload))
+                self.assertGreater(len(chunks), 1)
+                self.assertEqual(json.loads(b''.join(chunks)), payload)
+                self.assertEqual(json.loads(gzip.decompress(b''.join(cronitor.monitor._encode_body(payload, compress=True)))), payload)
+
+        yaml_body = b''.join(cronitor.monitor._encode_body(YAML_FORMAT_MONITORS, request_format='yaml', compress=True))
+        self.assertEqual(yaml.safe_load(gzip.decompress(yaml_body)), YAML_FORMAT_MONITORS)
+
+
+def serve(handle):
+    """Serve HTTP on a local port, calling handle(request_handler) for every request. Returns the base url."""
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            handle(self)
+        do_PUT = do_GET
+
+        def log_message(self, *args):
+            pass
+
+    server = HTTPServer(('127.0.0.1', 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, 'http://127.0.0.1:{}'.format(server.server_port)
+
+
+class TransportTests(unittest.TestCase):
+
+    def setUp(self):
+        cronitor.api_key = FAKE_API_KEY
+
+    @patch('cronitor.Monitor._limiter', new_callable=lambda: TokenBucket(100))
+    def test_throttling_is_only_retried_by_api_request(self, limiter):
+        requests_seen = []
+
+        def throttle(handler):
+            requests_seen.append(handler.path)
+            handler.send_response(429)
+            handler.send_header('Retry-After', '0')
+            handler.send_header('Content-Length', '0')
+            handler.end_headers()
+
+        server, url = serve(throttle)
+        self.addCleanup(server.shutdown)
+        with self.assertRaises(cronitor.RateLimitError):
+            cronitor.Monitor._api_request('get', url + '/api/monitors', FAKE_API_KEY)
+        self.assertEqual(len(requests_seen), cronitor.monitor.API_ATTEMPTS)
+
+    @patch('cronitor.Monitor._limiter', new_callable=lambda: TokenBucket(100))
+    def test_streamed_body_is_recreated_after_dropped_connection(self, limiter):
+        bodies = []
+
+        def drop_first(handler):
+            if not bodies:
+                bodies.append(None)
+                handler.close_connection = True
+                return
+            body = b''
+            while True:
+                size = int(handler.rfile.readline().strip(), 16)
+                body += handler.rfile.read(size)
+                handler.rfile.readline()
+                if not size:
+                    break
+            bodies.append(body)
+            handler.send_response(200)
+            handler.send_header('Content-Length', '0')
+            handler.end_headers()
+
+        server, url = serve(drop_first)
+        self.addCleanup(server.shutdown)
+        payload = {'monitors': [MONITOR, MONITOR_2]}
+        with patch('cronitor.monitor.time.sleep'):
+            resp = cronitor.Monitor._api_request('put', url + '/api/monitors', FAKE_API_KEY,
+                                                 data=lambda: cronitor.monitor._encode_body(payload), stream=True)
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(len(bodies), 2)
+        self.assertEqual(json.loads(bodies[1]), payload)
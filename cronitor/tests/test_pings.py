@@ -4,6 +4,7 @@ from unittest.mock import patch, ANY, call
 from unittest.mock import MagicMock
 import cronitor
 import pytest
+from cronitor.dedup import event_id
 
 # a reserved monitorkey for running integration tests against cronitor.link
 FAKE_KEY = 'd3x0c1'
@@ -13,6 +14,7 @@ class MonitorPingTests(unittest.TestCase):
 
     def setUp(self):
         cronitor.api_key = FAKE_API_KEY
+        cronitor.Monitor._recent.clear()
 
     def test_endpoints(self):
         monitor = cronitor.Monitor(key=FAKE_KEY)
@@ -50,12 +52,48 @@ class MonitorPingTests(unittest.TestCase):
         ping.assert_called_once_with(
             headers={
                 'User-Agent': 'cronitor-python',
+                'Idempotency-Key': event_id(FAKE_KEY, 'run', 'abc', env='staging', api_key=FAKE_API_KEY),
             },
             params=params,
             timeout=5,
             url='https://cronitor.link/p/{}/{}'.format(FAKE_API_KEY, FAKE_KEY))
 
 
+    @patch('cronitor.Monitor._req.get')
+    def test_duplicate_series_events_are_sent_once(self, ping):
+        ping.return_value.status_code = 200
+        monitor = cronitor.Monitor(FAKE_KEY)
+        monitor.ping(state='fail', series='task-1')
+        monitor.ping(state='fail', series='task-1', message='retried')
+        monitor.ping(state='complete', series='task-1')
+        monitor.ping(state='fail', series='task-2')
+        monitor.ping()
+        monitor.ping()
+        self.assertEqual(ping.call_count, 5)
+
+    @patch('cronitor.Monitor._req.get')
+    def test_duplicate_returns_accepted(self, ping):
+        monitor = cronitor.Monitor(FAKE_KEY)
+        monitor.ping(state='run', series='task-1')
+        self.assertTrue(monitor.ping(state='run', series='task-1').ok)
+        cronitor.Monitor(FAKE_KEY, env='staging').ping(state='run', series='task-1')
+        self.assertEqual(ping.call_count, 2)
+
+    @patch('cronitor.Monitor._req.get')
+    def test_failed_event_can_be_resent(self, ping):
+        ping.return_value.ok = False
+        ping.return_value.status_code = 503
+        monitor = cronitor.Monitor(FAKE_KEY)
+        monitor.ping(state='fail', series='task-1')
+        monitor.ping(state='fail', series='task-1')
+        self.assertEqual(ping.call_count, 2)
+
+    def test_event_id_is_stable(self):
+        self.assertEqual(event_id('a', 'run', 1.5), event_id('a', 'run', 1.5))
+        self.assertNotEqual(event_id('a', 'run', 1.5), event_id('a', 'complete', 1.5))
+        self.assertNotEqual(event_id('a', 'run', 1.5), event_id('a', 'run', 1.5, env='staging'))
+        self.assertNotEqual(event_id('a', 'run', 1.5), event_id('a', 'run', 1.5, api_key='other'))
+
     def test_convert_metrics_hash(self):
         monitor = cronitor.Monitor(FAKE_KEY)
         clean = monitor._clean_params({ 'metrics': {
@@ -0,0 +1,140 @@
+import io
+import json
+import os
+import socket
+import tempfile
+import threading
+import time
+import unittest
+from unittest.mock import patch, ANY
+
+import requests
+
+import cronitor
+from cronitor.tests import wait_for
+from cronitor import relay
+from cronitor import __main__ as cli
+
+FAKE_KEY = 'd3x0c1'
+FAKE_API_KEY = 'ping-api-key'
+
+
+class ParseAddressTests(unittest.TestCase):
+
+    def test_parse_address(self):
+        self.assertEqual(relay.parse_address('unix:///tmp/c.sock'), (socket.AF_UNIX, '/tmp/c.sock'))
+        self.assertEqual(relay.parse_address('/tmp/c.sock'), (socket.AF_UNIX, '/tmp/c.sock'))
+        self.assertEqual(relay.parse_address('udp://127.0.0.1:2992'), (socket.AF_INET, ('127.0.0.1', 2992)))
+        self.assertEqual(relay.parse_address('localhost:2992'), (socket.AF_INET, ('localhost', 2992)))
+        with self.assertRaises(ValueError):
+            relay.parse_address('localhost')
+
+
+class RelayServerTests(unittest.TestCase):
+
+    def setUp(self):
+        cronitor.api_key = FAKE_API_KEY
+        cronitor.Monitor._recent.clear()
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.address = 'unix://' + os.path.join(self.tmpdir.name, 'relay.sock')
+        self.spool = os.path.join(self.tmpdir.name, 'spool.jsonl')
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def start(self, address=None, **kwargs):
+        server = relay.RelayServer(address or self.address, workers=2, spool=self.spool, **kwargs)
+        server.bind()
+        thread = threading.Thread(target=server.serve_forever)
+        thread.start()
+        self.addCleanup(thread.join)
+        self.addCleanup(server.stop)
+        return server
+
+    @patch('cronitor.Monitor._req.get')
+    def test_monitor_hands_off_to_relay(self, mocked_get):
+        self.start()
+        monitor = cronitor.Monitor(FAKE_KEY, relay_address=self.address)
+        self.assertTrue(monitor.ping(state='run', series='abc'))
+        self.assertTrue(monitor.ping(state='run', series='abc'))
+        self.assertTrue(monitor.ping(state='complete', series='abc'))
+
+        self.assertTrue(wait_for(lambda: mocked_get.call_count == 2))
+        time.sleep(0.1)
+        self.assertEqual(mocked_get.call_count, 2)
+        params = mocked_get.call_args_list[0][1]['params']
+        self.assertEqual(params['state'], 'run')
+        self.assertEqual(params['series'], 'abc')
+        mocked_get.assert_called_with(url='https://cronitor.link/p/{}/{}'.format(FAKE_API_KEY, FAKE_KEY),
+                                      params=ANY, timeout=5, headers=ANY)
+
+    @patch('cronitor.Monitor._req.get')
+    def test_monitor_hands_off_to_udp_relay(self, mocked_get):
+        server = self.start('udp://127.0.0.1:0')
+        address = 'udp://127.0.0.1:{}'.format(server._sock.getsockname()[1])
+        monitor = cronitor.Monitor(FAKE_KEY, relay_address=address)
+        self.assertTrue(monitor.ping(state='run', series='abc').ok)
+        self.assertTrue(monitor.ping(state='complete', series='abc').ok)
+
+        self.assertTrue(wait_for(lambda: mocked_get.call_count == 2))
+        self.assertCountEqual([c[1]['params']['state'] for c in mocked_get.call_args_list], ['run', 'complete'])
+
+    @patch('cronitor.Monitor._req.get')
+    def test_relayed_ping_returns_accepted(self, mocked_get):
+        self.start()
+        resp = cronitor.Monitor(FAKE_KEY, relay_address=self.address).ping(state='run')
+        self.assertTrue(resp.ok)
+        self.assertEqual(resp.status_code, 202)
+
+    @patch('cronitor.Monitor._req.get')
+    def test_cli_commands_with_relay(self, mocked_get):
+        self.start()
+        with patch('cronitor.relay_address', self.address):
+            self.assertEqual(cli.main(['--key', FAKE_KEY, '--run']), 0)
+            with patch('sys.stdin', io.StringIO('a run\nb complete\n')):
+                self.assertEqual(cli.main(['stream', '--workers', '1']), 0)
+        self.assertTrue(wait_for(lambda: mocked_get.call_count == 3))
+
+    @patch('cronitor.Monitor._req.get')
+    def test_stalled_relay_does_not_block_pings(self, mocked_get):
+        # a relay that never reads: once its queue is full, pings are sent directly
+        stalled = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        stalled.bind(self.address[len('unix://'):])
+        self.addCleanup(stalled.close)
+
+        monitor = cronitor.Monitor(FAKE_KEY, relay_address=self.address)
+        thread = threading.Thread(target=lambda: [monitor.ping(message=str(i)) for i in range(1000)], daemon=True)
+        thread.start()
+        thread.join(5)
+        self.assertFalse(thread.is_alive())
+        self.assertGreater(mocked_get.call_count, 0)
+
+    @patch('cronitor.Monitor._req.get')
+    def test_large_event_is_sent_directly(self, mocked_get):
+        self.start()
+        monitor = cronitor.Monitor(FAKE_KEY, relay_address=self.address)
+        monitor.ping(state='complete', message='x' * 100000)
+        self.assertEqual(mocked_get.call_count, 1)
+        self.assertEqual(len(mocked_get.call_args[1]['params']['message']), 100000)
+
+    @patch('cronitor.Monitor._req.get')
+    def test_falls_back_to_direct_ping_without_relay(self, mocked_get):
+        monitor = cronitor.Monitor(FAKE_KEY, relay_address=self.address)
+        monitor.ping(state='run')
+        self.assertEqual(mocked_get.call_count, 1)
+
+    @patch('cronitor.Monitor._req.get', side_effect=requests.exceptions.ConnectionError)
+    def test_undelivered_events_are_spooled_and_replayed(self, mocked_get):
+        server = relay.RelayServer(self.address, workers=1, spool=self.spool)
+        server.handle(json.dumps({'key': FAKE_KEY, 'api_key': FAKE_API_KEY, 'state': 'fail', 'stamp': 1}).encode())
+        server._dispatcher.join()
+
+        with open(self.spool) as spool:
+            self.assertEqual(json.loads(spool.read()),
+                             {'key': FAKE_KEY, 'api_key': FAKE_API_KEY, 'env': None, 'state': 'fail', 'stamp': 1})
+
+        mocked_get.side_effect = None
+        self.assertEqual(server.replay(), 1)
+        server._dispatcher.close()
+        self.assertFalse(os.path.exists(self.spool))
+        self.assertEqual(mocked_get.call_args[1]['params']['stamp'], 1)
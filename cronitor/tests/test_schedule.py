@@ -0,0 +1,184 @@
+import unittest
+from datetime import datetime, timedelta, timezone
+from unittest.mock import patch, MagicMock
+
+import yaml
+
+import cronitor
+from cronitor import schedule
+
+UTC = timezone.utc
+YAML_PATH = './cronitor/tests/cronitor.yaml'
+
+
+def at(*args):
+    return datetime(*args, tzinfo=UTC)
+
+
+class ParseTests(unittest.TestCase):
+
+    def test_parse_cron(self):
+        s = schedule.parse('*/15 9-17 * * mon-fri')
+        self.assertIsInstance(s, schedule.CronSchedule)
+        self.assertEqual(s.minutes, (1 << 0) | (1 << 15) | (1 << 30) | (1 << 45))
+        self.assertIs(s, schedule.parse('*/15  9-17 * *  MON-FRI'))
+
+    def test_parse_interval(self):
+        self.assertEqual(schedule.parse('every 10 minutes').interval, timedelta(minutes=10))
+        self.assertEqual(schedule.parse('every 1 hour, 2 minutes and 3.50 seconds').interval,
+                         timedelta(hours=1, minutes=2, seconds=3.5))
+        self.assertEqual(schedule.parse('every day').interval, timedelta(days=1))
+
+    def test_parse_unsupported_formats(self):
+        for text in ('@reboot', '0 0 L * *', '0 0 * * 5#3', 'every 2 months', 'at 8:00 am'):
+            self.assertIsNone(schedule.parse(text), text)
+
+    def test_parse_invalid(self):
+        for text in ('61 * * * *', '* * * *', '0 0 * * 8', '*/0 * * * *', '0 5-2 * * *', '0 0 * foo *', 'every 0 seconds'):
+            with self.assertRaises(schedule.InvalidSchedule, msg=text):
+                schedule.parse(text)
+
+    def test_max_duration(self):
+        self.assertEqual(schedule.max_duration(['metric.count > 0', 'metric.duration < 5 minutes']), 300)
+        self.assertIsNone(schedule.max_duration(['metric.count > 0']))
+        self.assertIsNone(schedule.max_duration(None))
+
+
+class CronScheduleTests(unittest.TestCase):
+
+    def test_next(self):
+        s = schedule.parse('30 2 * * *')
+        self.assertEqual(s.next(at(2024, 1, 1, 1, 0)), at(2024, 1, 1, 2, 30))
+        self.assertEqual(s.next(at(2024, 1, 1, 2, 30)), at(2024, 1, 2, 2, 30))
+        self.assertEqual(s.next(at(2024, 12, 31, 3, 0)), at(2025, 1, 1, 2, 30))
+
+    def test_next_across_months_and_leap_years(self):
+        self.assertEqual(schedule.parse('0 0 29 2 *').next(at(2021, 3, 1)), at(2024, 2, 29))
+        self.assertEqual(schedule.parse('0 12 1 jan,jul *').next(at(2024, 2, 10)), at(2024, 7, 1, 12, 0))
+        self.assertIsNone(schedule.parse('0 0 30 2 *').next(at(2024, 1, 1)))
+
+    def test_day_of_month_or_day_of_week(self):
+        # both restricted: either matches
+        s = schedule.parse('0 0 13 * 5')
+        self.assertEqual(s.next(at(2024, 9, 1)), at(2024, 9, 6))
+        self.assertEqual(s.next(at(2024, 9, 6)), at(2024, 9, 13))
+        # day of week 7 is Sunday
+        self.assertEqual(schedule.parse('0 0 * * 7').next(at(2024, 9, 2)), at(2024, 9, 8))
+
+    def test_prev(self):
+        s = schedule.parse('*/20 9-17 * * mon-fri')
+        self.assertEqual(s.prev(at(2024, 9, 4, 12, 59)), at(2024, 9, 4, 12, 40))
+        self.assertEqual(s.prev(at(2024, 9, 4, 12, 40)), at(2024, 9, 4, 12, 40))
+        self.assertEqual(s.prev(at(2024, 9, 4, 8, 0)), at(2024, 9, 3, 17, 40))
+        self.assertEqual(s.prev(at(2024, 9, 8, 12, 0)), at(2024, 9, 6, 17, 40))
+        self.assertEqual(schedule.parse('0 0 1 1 *').prev(at(2024, 6, 1)), at(2024, 1, 1))
+
+    def test_next_matches_brute_force(self):
+        for text in ('*/7 * * * *', '5 */3 * * 1-5', '0 0 1,15 * *', '45 23 * 2 *'):
+            s = schedule.parse(text)
+            t = at(2024, 1, 30, 22, 0)
+            expected = t + timedelta(minutes=1)
+            while not s.matches(expected):
+                expected += timedelta(minutes=1)
+            self.assertEqual(s.next(t), expected, text)
+            self.assertEqual(s.prev(expected), expected, text)
+
+
+class WatchdogTests(unittest.TestCase):
+
+    def test_missed_run(self):
+        watchdog = schedule.Watchdog()
+        watchdog.track('hourly', '0 * * * *', grace=60, now=at(2024, 1, 1, 0, 30))
+        self.assertEqual(watchdog.check(at(2024, 1, 1, 1, 0, 59)), [])
+        self.assertEqual(watchdog.check(at(2024, 1, 1, 1, 1)),
+                         [schedule.Alert('hourly', schedule.MISSED, at(2024, 1, 1, 1, 0))])
+        # each missed window is reported once, even after a long gap
+        self.assertEqual(len(watchdog.check(at(2024, 1, 1, 5, 30))), 1)
+        self.assertEqual(watchdog.check(at(2024, 1, 1, 5, 31)), [])
+
+    def test_run_on_time_is_not_missed(self):
+        watchdog = schedule.Watchdog()
+        watchdog.track('hourly', '0 * * * *', now=at(2024, 1, 1, 0, 30))
+        watchdog.run_started('hourly', at(2024, 1, 1, 0, 59, 50))
+        watchdog.run_finished('hourly', at(2024, 1, 1, 1, 0, 10))
+        self.assertEqual(watchdog.check(at(2024, 1, 1, 1, 30)), [])
+        self.assertEqual(watchdog.check(at(2024, 1, 1, 2, 1))[0].expected, at(2024, 1, 1, 2, 0))
+
+    def test_overrun(self):
+        watchdog = schedule.Watchdog()
+        watchdog.track('every', 'every 10 minutes', max_duration=60, now=at(2024, 1, 1))
+        watchdog.run_started('every', at(2024, 1, 1, 0, 5))
+        self.assertEqual(watchdog.check(at(2024, 1, 1, 0, 6, 1)),
+                         [schedule.Alert('every', schedule.OVERRUN, at(2024, 1, 1, 0, 6))])
+
+        watchdog.run_started('every', at(2024, 1, 1, 0, 15))
+        watchdog.run_finished('every', at(2024, 1, 1, 0, 15, 30))
+        self.assertEqual(watchdog.check(at(2024, 1, 1, 0, 17)), [])
+
+    def test_schedule_in_job_timezone(self):
+        watchdog = schedule.Watchdog()
+        watchdog.track('morning', '0 9 * * *', tz='America/New_York', now=at(2024, 1, 1))
+        # 09:00 UTC is not 09:00 in New York
+        self.assertEqual(watchdog.check(at(2024, 1, 1, 9, 5)), [])
+        alerts = watchdog.check(at(2024, 1, 1, 14, 1, 1))
+        self.assertEqual(len(alerts), 1)
+        self.assertEqual(alerts[0].expected, at(2024, 1, 1, 14, 0))
+
+    def test_unknown_timezone(self):
+        with self.assertRaises(schedule.InvalidSchedule):
+            schedule.Watchdog().track('job', '0 9 * * *', tz='Mars/Olympus_Mons')
+
+    def test_hooks_are_called(self):
+        watchdog = schedule.Watchdog(tick=3600)
+        hook = MagicMock()
+        watchdog.add_hook(hook)
+        watchdog.track('hourly', '0 * * * *', now=at(2024, 1, 1))
+        alerts = watchdog.check(at(2024, 1, 1, 2))
+        hook.assert_called_once_with(alerts[0])
+        watchdog.stop()
+
+    def test_check_scales_with_due_jobs(self):
+        watchdog = schedule.Watchdog()
+        for i in range(5000):
+            watchdog.track('job-{}'.format(i), '{} 0 * * *'.format(i % 60), now=at(2024, 1, 1))
+        self.assertEqual(watchdog.check(at(2024, 1, 1, 0, 0, 30)), [])
+        # jobs due at minutes 1 through 9 are past their grace period
+        due = sum(1 for i in range(5000) if 1 <= i % 60 <= 9)
+        self.assertEqual(len(watchdog.check(at(2024, 1, 1, 0, 10, 30))), due)
+
+    def test_job_decorator_tracks_schedule(self):
+        client = cronitor.Client(api_key='tenant-a')
+        client.sync = MagicMock()
+
+        @cronitor.job('tracked', attributes={'schedule': '0 0 * * *', 'assertions': ['metric.duration < 1 minute'],
+                                             'timezone': 'Europe/Berlin'},
+                      client=client)
+        def task():
+            return
+
+        self.assertEqual(len(client.watchdog), 1)
+        self.assertEqual(str(client.watchdog._jobs['tracked'].tz), 'Europe/Berlin')
+        with patch('cronitor.Monitor.ping'), patch.object(client.watchdog, 'run_started') as started, \
+                patch.object(client.watchdog, 'run_finished') as finished:
+            task()
+        started.assert_called_once_with('tracked')
+        finished.assert_called_once_with('tracked')
+
+
+class ValidateSchedulesTests(unittest.TestCase):
+
+    def test_validate_schedules(self):
+        with open(YAML_PATH) as conf:
+            cronitor.validate_schedules(yaml.safe_load(conf))
+
+        with self.assertRaises(cronitor.ConfigValidationError):
+            cronitor.validate_schedules({'jobs': {'bad': {'schedule': '0 25 * * *'}}})
+        with self.assertRaises(cronitor.ConfigValidationError):
+            cronitor.validate_schedules({'jobs': [{'key': 'bad', 'schedule': '* * *'}]})
+
+    @patch('cronitor.Monitor.put')
+    def test_validate_config_rejects_invalid_schedule(self, mock):
+        with patch('cronitor.config', YAML_PATH), \
+                patch('cronitor.read_config', return_value={'jobs': {'bad': {'schedule': '0 25 * * *'}}}):
+            self.assertFalse(cronitor.validate_config())
+        mock.assert_not_called()
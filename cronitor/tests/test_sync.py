@@ -0,0 +1,102 @@
+import threading
+import time
+import unittest
+from unittest.mock import patch, MagicMock
+
+import cronitor
+from cronitor.tests import wait_for
+from cronitor.sync import MonitorSync, MAX_BATCH_SIZE
+
+
+class MonitorSyncTests(unittest.TestCase):
+
+    def setUp(self):
+        self.monitor_class = MagicMock()
+        self.sync = MonitorSync(self.monitor_class, debounce=0.1)
+
+    def test_registrations_are_coalesced_into_one_put(self):
+        threads = [threading.Thread(target=self.sync.register, args=({'key': 'job-{}'.format(i), 'schedule': '* * * * *'},))
+                   for i in range(20)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertTrue(wait_for(lambda: self.monitor_class.put.called))
+        time.sleep(0.2)
+        self.monitor_class.put.assert_called_once()
+        self.assertCountEqual([m['key'] for m in self.monitor_class.put.call_args[0][0]],
+                              ['job-{}'.format(i) for i in range(20)])
+
+    def test_unchanged_attributes_are_not_synced_again(self):
+        self.assertTrue(self.sync.register({'key': 'a', 'schedule': '0 * * * *'}))
+        self.assertEqual(self.sync.flush(), 1)
+        self.assertFalse(self.sync.register({'schedule': '0 * * * *', 'key': 'a'}))
+        self.assertTrue(self.sync.register({'key': 'a', 'schedule': '5 * * * *'}))
+        self.assertEqual(self.sync.flush(), 1)
+        self.assertEqual(self.monitor_class.put.call_count, 2)
+
+    def test_late_registrations_are_synced(self):
+        self.sync.register({'key': 'early'})
+        self.assertTrue(wait_for(lambda: self.monitor_class.put.call_count == 1))
+        self.sync.register({'key': 'late'})
+        self.assertTrue(wait_for(lambda: self.monitor_class.put.call_count == 2))
+        self.monitor_class.put.assert_called_with([{'key': 'late'}])
+
+    def test_large_registrations_are_batched(self):
+        for i in range(MAX_BATCH_SIZE + 1):
+            self.sync.register({'key': 'job-{}'.format(i)})
+        self.assertEqual(self.sync.flush(), MAX_BATCH_SIZE + 1)
+        self.assertEqual(self.monitor_class.put.call_count, 2)
+
+    def test_failed_sync_is_retried_on_next_registration(self):
+        self.monitor_class.put.side_effect = cronitor.APIError('down')
+        self.sync.register({'key': 'a'})
+        self.assertEqual(self.sync.flush(), 0)
+        self.monitor_class.put.side_effect = None
+        self.assertTrue(self.sync.register({'key': 'a'}))
+        self.assertEqual(self.sync.flush(), 1)
+
+    def test_failed_batch_is_retried_with_backoff(self):
+        self.monitor_class.put.side_effect = [cronitor.APIError('down'), None]
+        self.sync.register({'key': 'a'})
+        self.assertTrue(wait_for(lambda: self.monitor_class.put.call_count == 2))
+        self.assertFalse(self.sync.register({'key': 'a'}))
+
+    def test_unexpected_error_is_retried(self):
+        errors = [ValueError('bad response body')]
+
+        def put(monitors):
+            if errors:
+                raise errors.pop()
+        self.monitor_class.put.side_effect = put
+        with patch('cronitor.sync.logger'):
+            self.sync.register({'key': 'a'})
+            self.assertTrue(wait_for(lambda: self.monitor_class.put.call_count == 2))
+        self.assertFalse(self.sync.register({'key': 'a'}))
+        # the sync thread is still running
+        self.sync.register({'key': 'b'})
+        self.assertTrue(wait_for(lambda: self.monitor_class.put.call_count == 3))
+
+    def test_flush_waits_for_sync_in_progress(self):
+        self.monitor_class.put.side_effect = lambda monitors: time.sleep(0.3)
+        self.sync.register({'key': 'a'})
+        self.assertTrue(wait_for(lambda: self.monitor_class.put.called))
+        self.sync.flush()
+        # the background sync finished before flush returned
+        self.assertFalse(self.sync.register({'key': 'a'}))
+        self.monitor_class.put.assert_called_once()
+
+    @patch('cronitor.Monitor.put')
+    def test_deprecated_monitor_attributes_are_synced(self, put):
+        cronitor.monitor_attributes.append({'key': 'legacy-job', 'schedule': '0 0 * * *'})
+        self.assertGreaterEqual(cronitor.sync_monitors(wait=0), 1)
+        # other jobs registered with the default client may be synced in the same batch
+        self.assertIn({'key': 'legacy-job', 'schedule': '0 0 * * *'}, put.call_args[0][0])
+        self.assertEqual(cronitor.monitor_attributes, [])
+
+    def test_job_registers_with_client(self):
+        client = cronitor.Client(api_key='tenant-a')
+        with patch.object(client.sync, 'register') as register:
+            cronitor.job('client-job', attributes={'schedule': '0 0 * * *'}, client=client)
+            register.assert_called_once_with({'key': 'client-job', 'schedule': '0 0 * * *'})
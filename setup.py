@@ -20,5 +20,8 @@ setup(
         'humanize',
         'urllib3'
     ],
+    extras_require={
+        'orjson': ['orjson'],
+    },
     entry_points=dict(console_scripts=['cronitor = cronitor.__main__:main'])
 )